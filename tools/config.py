@@ -10,9 +10,17 @@ class Config:
     CF_ACCOUNT_ID = os.getenv('CF_ACCOUNT_ID', "086001d6706e622db6e36d54236a02be")
     CF_DATABASE_ID = os.getenv('CF_DATABASE_ID', "32ee2a66-2503-4c4c-9772-2773d6776b33")
     CF_API_TOKEN = os.getenv('CF_API_TOKEN')
+    D1_POOL_SIZE = int(os.getenv('D1_POOL_SIZE', 16))  # keep-alive 连接池上限 (每进程)
+    D1_CONNECT_TIMEOUT = float(os.getenv('D1_CONNECT_TIMEOUT', 3.05))  # 建连超时 (秒)
+    D1_TIMEOUT = float(os.getenv('D1_TIMEOUT', 3))  # 单条查询读取超时 (秒)
+    D1_BATCH_TIMEOUT = float(os.getenv('D1_BATCH_TIMEOUT', 20))  # 批量查询读取超时 (秒)
+    D1_BATCH_MAX_STATEMENTS = int(os.getenv('D1_BATCH_MAX_STATEMENTS', 50))  # 单个批量请求的语句数上限，超出分块
+    D1_BATCH_MAX_BYTES = int(os.getenv('D1_BATCH_MAX_BYTES', 1024 * 1024))  # 单个批量请求体字节上限，超出分块
 
     # --- 本地数据库配置 (Local) ---
     LOCAL_DB_PATH = "local_debug.sqlite"
+    SQLITE_CACHED_STATEMENTS = int(os.getenv('SQLITE_CACHED_STATEMENTS', 256))  # 每个连接缓存的已编译语句数
+    SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', 5))  # 等待写锁的时间 (秒)
 
     # --- 认证与安全 ---
     # 用于签发 JWT 的密钥，生产环境请务必修改！
@@ -35,3 +43,31 @@ class Config:
     R2_ENDPOINT = os.getenv('R2_ENDPOINT') or os.getenv('Endpoint')
     R2_BUCKET = os.getenv('R2_BUCKET', 'inventory-assets')
     R2_PUBLIC_URL = os.getenv('R2_PUBLIC_URL', 'https://pub-1f8bb9b02a224c45920856332170406e.r2.dev')
+
+    # --- LVGL 转换结果缓存 ---
+    LVGL_CACHE_ITEMS = int(os.getenv('LVGL_CACHE_ITEMS', 256))
+    LVGL_CACHE_MB = int(os.getenv('LVGL_CACHE_MB', 64))
+    LVGL_CACHE_DIR = os.getenv('LVGL_CACHE_DIR')  # 未设置时仅使用内存层
+    LVGL_CACHE_DISK_MB = int(os.getenv('LVGL_CACHE_DISK_MB', 512))
+
+    # --- LVGL 转换进程池 (WORKERS=0 时在请求线程内同步转换) ---
+    LVGL_POOL_WORKERS = int(os.getenv('LVGL_POOL_WORKERS', os.cpu_count() or 2))
+    LVGL_POOL_QUEUE = int(os.getenv('LVGL_POOL_QUEUE', LVGL_POOL_WORKERS * 4))
+    LVGL_JOB_TIMEOUT = int(os.getenv('LVGL_JOB_TIMEOUT', 60))  # 单任务超时 (秒)，超时即 kill 子进程
+    LVGL_JOB_TTL = int(os.getenv('LVGL_JOB_TTL', 600))  # 异步任务结果保留时间 (秒)，任务表在进程内，需单个 Web worker
+
+    # --- LVGL 自动压缩 (compress=AUTO) ---
+    LVGL_AUTO_POLICY = os.getenv('LVGL_AUTO_POLICY', 'smallest')  # smallest: 最小输出; fastest: 预算内解码最快
+    LVGL_AUTO_BUDGET = float(os.getenv('LVGL_AUTO_BUDGET', 0.6))  # fastest 策略允许的 压缩后/原始 大小比例
+    LVGL_AUTO_EARLY_RATIO = float(os.getenv('LVGL_AUTO_EARLY_RATIO', 0.25))  # 按解码顺序，编码器达到该比例即停止等待
+
+    # --- LVGL 批量转换 ---
+    LVGL_BATCH_MAX_FILES = int(os.getenv('LVGL_BATCH_MAX_FILES', 500))
+    LVGL_BATCH_MAX_MB = int(os.getenv('LVGL_BATCH_MAX_MB', 100))  # 解压后总大小上限
+
+    # --- LVGL 设备端预览 ---
+    LVGL_PREVIEW_PER_CONVERT = int(os.getenv('LVGL_PREVIEW_PER_CONVERT', 5))  # /preview 每日次数上限 = 转换配额 x 该倍数
+
+    # --- LVGL 大图处理 ---
+    LVGL_MAX_PIXELS = int(os.getenv('LVGL_MAX_PIXELS', 4096 * 4096))  # 源图与目标尺寸的像素上限，解码前检查
+    LVGL_BAND_ROWS = int(os.getenv('LVGL_BAND_ROWS', 64))  # 非索引格式按行带转换 RGBA 并打包 (源图仍整图解码一次)，每带行数
@@ -1,8 +1,12 @@
 import sqlite3
+import json
 import requests
 import urllib3
 import os
+import threading
+from requests.adapters import HTTPAdapter
 from .config import Config
+from .migrations import migrate
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -10,86 +14,95 @@ class Database:
     def __init__(self):
         self.env = Config.ENV
         if self.env == 'local':
+            self._local = threading.local()
             self.init_local_db()
         else:
             self.url = f"https://api.cloudflare.com/client/v4/accounts/{Config.CF_ACCOUNT_ID}/d1/database/{Config.CF_DATABASE_ID}/query"
             self.headers = {"Authorization": f"Bearer {Config.CF_API_TOKEN}", "Content-Type": "application/json"}
+            self._session = None
+            self._session_pid = None
+            self._session_lock = threading.Lock()
 
-    def init_local_db(self):
-        # 保持本地 SQLite 结构同步
-        schema = """
-        CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE, password_hash TEXT, role TEXT DEFAULT 'free', avatar TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
-        CREATE TABLE IF NOT EXISTS tool_configs (
-            path TEXT PRIMARY KEY, 
-            is_public INTEGER DEFAULT 0, 
-            required_role TEXT DEFAULT 'user', 
-            limit_type TEXT DEFAULT 'request', 
-            daily_limit_free INTEGER DEFAULT 10, 
-            daily_limit_pro INTEGER DEFAULT 1000,
-            shadow TEXT,
-            label TEXT,
-            color TEXT
-        );
-        CREATE TABLE IF NOT EXISTS usage_logs (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, path TEXT, status INTEGER DEFAULT 200, request_date DATE DEFAULT (DATE('now')), created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
-        CREATE TABLE IF NOT EXISTS components (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, category TEXT, name TEXT, model TEXT, package TEXT, quantity INTEGER, unit TEXT, price REAL, supplier TEXT, channel TEXT, location TEXT, buy_time TEXT, remark TEXT, creator TEXT, img_path TEXT, doc_path TEXT, qrcode_path TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
-        
-        -- 新增：元器件多文档支持
-        CREATE TABLE IF NOT EXISTS component_docs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            component_id INTEGER NOT NULL,
-            user_id INTEGER NOT NULL,
-            file_name TEXT NOT NULL,
-            file_url TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-
-        -- 新增：Project Hub 项目表
-        CREATE TABLE IF NOT EXISTS projects (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            name TEXT NOT NULL,
-            status TEXT DEFAULT '进行中',
-            description TEXT,
-            cover_img TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
+    @property
+    def session(self):
+        """
+        进程内共享的 keep-alive 连接池：复用 TCP+TLS 连接，省去每次查询的握手
+        按 pid 惰性创建，fork 出的 worker 不会继承父进程的 socket
+        """
+        if self._session is None or self._session_pid != os.getpid():
+            with self._session_lock:
+                if self._session is None or self._session_pid != os.getpid():
+                    session = requests.Session()
+                    session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=Config.D1_POOL_SIZE))
+                    session.headers.update(self.headers)
+                    session.verify = False
+                    session.trust_env = False  # 不走环境变量代理
+                    self._session, self._session_pid = session, os.getpid()
+        return self._session
+
+    def _post(self, payload, timeout):
+        return self.session.post(self.url, json=payload, timeout=(Config.D1_CONNECT_TIMEOUT, timeout))
+
+    @property
+    def conn(self):
         """
-        with sqlite3.connect(Config.LOCAL_DB_PATH) as conn: 
-            conn.executescript(schema)
+        本地 SQLite：每线程一个常驻连接，省去每次查询的打开/关闭与语句编译
+        autocommit 模式，多语句写入由调用方显式 BEGIN/COMMIT；按 pid 重建，fork 出的 worker 不共用连接
+        """
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(Config.LOCAL_DB_PATH, timeout=Config.SQLITE_BUSY_TIMEOUT,
+                                   isolation_level=None, cached_statements=Config.SQLITE_CACHED_STATEMENTS)
+            conn.execute("PRAGMA journal_mode=WAL")  # 读写互不阻塞
+            conn.execute("PRAGMA synchronous=NORMAL")  # WAL 下只在 checkpoint 时 fsync
+            local.conn, local.pid = conn, os.getpid()
+        return local.conn
+
+    def _fetch(self, cur, raw=False):
+        """raw=True 返回元组行 (列序同 SELECT)，否则返回 dict 行"""
+        rows = cur.fetchall()
+        if raw or not cur.description: return rows
+        cols = [d[0] for d in cur.description]
+        return [dict(zip(cols, r)) for r in rows]
+
+    def init_local_db(self):
+        # 本地 SQLite 结构由 migrations 维护，与 D1 同步
+        migrate(self)
+        conn = self.conn
+        with conn:
+            conn.execute("BEGIN")
             # 插入默认配置
             default_configs = [
                 ('/inventory', 1, 'user', 'storage', 500, 5000, 'shadow-blue-200', '元器件管理', 'bg-blue-500'),
                 ('/lvgl_image', 1, 'user', 'request', 20, 200, 'shadow-emerald-200', 'LVGL 图像处理', 'bg-emerald-500'),
                 ('/serial', 1, 'user', 'request', 100, 1000, 'shadow-indigo-200', '云端串口调试', 'bg-indigo-500')
             ]
-            for cfg in default_configs:
-                conn.execute("INSERT OR IGNORE INTO tool_configs (path, is_public, required_role, limit_type, daily_limit_free, daily_limit_pro, shadow, label, color) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", cfg)
-            conn.commit()
+            conn.executemany("INSERT OR IGNORE INTO tool_configs (path, is_public, required_role, limit_type, daily_limit_free, daily_limit_pro, shadow, label, color) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", default_configs)
 
-    def execute_multi(self, queries):
+    def execute_multi(self, queries, timeout=None, raw=False):
         """
         真正的批量查询：一次请求返回多个结果集。
         queries: [(sql, params), (sql, params), ...]
+        timeout: 读取超时 (秒)，默认 Config.D1_BATCH_TIMEOUT
+        raw: 结果行返回元组而非 dict
         """
         if self.env == 'local':
-            results = []
-            with sqlite3.connect(Config.LOCAL_DB_PATH) as conn:
-                conn.row_factory = sqlite3.Row
-                for sql, params in queries:
-                    res = conn.execute(sql, params or []).fetchall()
-                    results.append({'success': True, 'results': [dict(r) for r in res]})
-                conn.commit()
-            return results
+            conn = self.conn
+            with conn:  # 一个事务，异常时回滚
+                conn.execute("BEGIN")
+                return [{'success': True, 'results': self._fetch(conn.execute(sql, params or []), raw)} for sql, params in queries]
         else:
             # 构造 D1 批量请求体
             payload = [{"sql": sql, "params": params or []} for sql, params in queries]
             try:
-                resp = requests.post(self.url, headers=self.headers, json=payload, timeout=20, verify=False, proxies={"http": None, "https": None})
+                resp = self._post(payload, timeout or Config.D1_BATCH_TIMEOUT)
                 data = resp.json()
                 if data.get('success'):
                     # D1 批量查询会返回一个数组，每个元素包含 {success: true, results: [...]}
                     # 增加打印以确认结构
                     # print(f"D1 Batch Result: {data['result']}")
+                    if raw:
+                        for item in data['result']: item['results'] = [tuple(r.values()) for r in item.get('results') or []]
                     return data['result']
                 print(f"D1 Batch Error: {resp.text}")
                 return [{'success': False, 'results': [], 'error': 'Batch failed'}] * len(queries)
@@ -97,40 +110,172 @@ class Database:
                 print(f"D1 Batch Exception: {e}")
                 return [{'success': False, 'results': [], 'error': str(e)}] * len(queries)
 
-    def execute(self, sql, params=None):
-        if self.env == 'local': return self._execute_local(sql, params)
-        else: return self._execute_d1(sql, params)
+    def deferred(self, timeout=None):
+        """
+        延迟查询：视图先登记查询拿到 Deferred，首次取结果时把所有待发查询合并成一次 execute_multi
+        同一批次内相同的 (sql, params) 只查一次
+        用法：q = d1.deferred(); a = q.execute(sql, params); ...; a.result()  # 结果格式与 execute 相同
+        """
+        return DeferredBatch(self, timeout)
 
-    def execute_batch(self, batch_data):
-        """修复版：使用长连接复用，规避 D1 7400 格式错误"""
-        if self.env == 'local':
-            with sqlite3.connect(Config.LOCAL_DB_PATH) as conn:
-                for sql, params in batch_data: conn.execute(sql, params or [])
-                conn.commit()
-            return {'success': True}
-        else:
-            session = requests.Session()
-            session.headers.update(self.headers)
+    def execute(self, sql, params=None, timeout=None, raw=False):
+        """
+        timeout: D1 读取超时 (秒)，默认 Config.D1_TIMEOUT；本地 SQLite 忽略
+        raw: 结果行返回元组而非 dict (列序同 SELECT)，热点路径省去建 dict 的开销
+        """
+        if self.env == 'local': return self._execute_local(sql, params, raw)
+        res = self._execute_d1(sql, params, timeout)
+        if res and raw: res['results'] = [tuple(r.values()) for r in res.get('results') or []]
+        return res
+
+    def execute_batch(self, batch_data, transactional=False, timeout=None):
+        """
+        批量写入：与 execute_multi 相同，整批语句放进一个请求体发送 (D1 在同一事务内执行一个请求体)
+        超过 D1_BATCH_MAX_STATEMENTS 条或 D1_BATCH_MAX_BYTES 字节时分块，每块一次请求
+        transactional=True：全部生效或全部不生效；D1 不支持跨请求事务，放不进一块时直接拒绝
+        transactional=False：某块被 D1 拒绝时逐条重试该块，定位出错语句，其余语句照常写入
+        返回 {'success': 是否全部成功, 'results': [每条语句的结果], 'error': 首个错误}
+        """
+        if self.env == 'local': results = self._execute_batch_local(batch_data, transactional)
+        else: results = self._execute_batch_d1(batch_data, transactional, timeout or Config.D1_BATCH_TIMEOUT)
+        errors = [r['error'] for r in results if not r.get('success')]
+        res = {'success': not errors, 'results': results}
+        # 事务回滚时其余语句都标为 Rolled back，报告出错语句本身的错误
+        if errors: res['error'] = next((e for e in errors if e != 'Rolled back'), errors[0])
+        return res
+
+    def _execute_batch_local(self, batch_data, transactional):
+        # 一个事务内执行；非事务模式下每条语句包一层 SAVEPOINT，失败只回滚该条
+        results = []
+        conn = self.conn
+        try:
+            conn.execute("BEGIN")
+            for sql, params in batch_data:
+                if not transactional: conn.execute("SAVEPOINT batch_item")
+                try:
+                    cur = conn.execute(sql, params or [])
+                    results.append({'success': True, 'results': [], 'meta': {'changes': cur.rowcount, 'last_row_id': cur.lastrowid}})
+                    if not transactional: conn.execute("RELEASE batch_item")
+                except sqlite3.Error as e:
+                    results.append({'success': False, 'error': str(e)})
+                    if transactional: break
+                    conn.execute("ROLLBACK TO batch_item"); conn.execute("RELEASE batch_item")
+            if transactional and results and not results[-1]['success']:
+                conn.execute("ROLLBACK")
+                results = [r if not r['success'] else {'success': False, 'error': 'Rolled back'} for r in results]
+                results += [{'success': False, 'error': 'Rolled back'}] * (len(batch_data) - len(results))
+            else: conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction: conn.execute("ROLLBACK")
+            raise
+        return results
+
+    def _batch_chunks(self, payload):
+        """按语句数与请求体字节数切分 D1 批量请求体"""
+        chunk, size = [], 0
+        for item in payload:
+            n = len(json.dumps(item))
+            if chunk and (len(chunk) >= Config.D1_BATCH_MAX_STATEMENTS or size + n > Config.D1_BATCH_MAX_BYTES):
+                yield chunk
+                chunk, size = [], 0
+            chunk.append(item); size += n
+        if chunk: yield chunk
+
+    def _post_batch(self, payload, timeout):
+        """发送一个批量请求体，返回 (True, 每条结果) 或 (False, D1 错误信息)；网络异常照常抛出"""
+        resp = self._post(payload, timeout)
+        data = resp.json()
+        if data.get('success'): return True, data['result']
+        return False, '; '.join(e.get('message', str(e)) for e in data.get('errors') or []) or resp.text
+
+    def _execute_batch_d1(self, batch_data, transactional, timeout):
+        payload = [{"sql": sql, "params": params or []} for sql, params in batch_data]
+        if not payload: return []
+        chunks = list(self._batch_chunks(payload))
+        if transactional and len(chunks) > 1:
+            return [{'success': False, 'error': f'Batch too large for one transaction ({len(payload)} statements, {len(chunks)} chunks)'}] * len(payload)
+        results = []
+        for chunk in chunks:
+            start = len(results)
             try:
-                for sql, params in batch_data:
-                    resp = session.post(self.url, json={"sql": sql, "params": params or []}, timeout=20, verify=False, proxies={"http": None, "https": None})
-                    if not resp.json().get('success'): print(f"⚠️ [DB] Batch item fail: {resp.text}")
-                return {'success': True}
-            except Exception as e: return {'success': False, 'error': str(e)}
-            finally: session.close()
-
-    def _execute_local(self, sql, params):
-        with sqlite3.connect(Config.LOCAL_DB_PATH) as conn:
-            conn.row_factory = sqlite3.Row
-            res = conn.execute(sql, params or []).fetchall()
-            conn.commit()
-            return {'success': True, 'results': [dict(r) for r in res]}
-
-    def _execute_d1(self, sql, params):
+                ok, res = self._post_batch(chunk, timeout)
+                if ok or transactional:
+                    results += res if ok else [{'success': False, 'error': res}] * len(chunk)
+                    continue
+                # 整块已被 D1 回滚：逐条重试，找出失败语句
+                print(f"⚠️ [DB] Batch chunk fail, retry one by one: {res}")
+                for item in chunk:
+                    ok, res = self._post_batch([item], timeout)
+                    results.append(res[0] if ok else {'success': False, 'error': res})
+            except Exception as e:
+                # 超时等情况无法确定是否已写入，不重试
+                print(f"⚠️ [DB] Batch chunk exception: {e}")
+                results += [{'success': False, 'error': str(e)}] * (start + len(chunk) - len(results))
+        return results
+
+    def _execute_local(self, sql, params, raw=False):
+        return {'success': True, 'results': self._fetch(self.conn.execute(sql, params or []), raw)}
+
+    def _execute_d1(self, sql, params, timeout=None):
         try:
-            resp = requests.post(self.url, headers=self.headers, json={"sql": sql, "params": params or []}, timeout=3, verify=False, proxies={"http": None, "https": None})
+            resp = self._post({"sql": sql, "params": params or []}, timeout or Config.D1_TIMEOUT)
             data = resp.json()
             return data['result'][0] if data.get('success') else None
         except: return None
 
+class Deferred:
+    """DeferredBatch 登记的单条查询，result() 时按需触发整批发送"""
+    def __init__(self, batch):
+        self._batch = batch
+        self._done = False
+        self._result = None
+        self._error = None
+
+    def _resolve(self, item):
+        # 与 execute 一致：成功返回 {'success', 'results', ...}，失败返回 None
+        self._result = item if item and item.get('success') else None
+        self._done = True
+
+    def result(self):
+        if not self._done: self._batch.flush()
+        if self._error: raise self._error
+        return self._result
+
+class DeferredBatch:
+    """一次请求内的延迟查询队列，见 Database.deferred"""
+    def __init__(self, db, timeout=None):
+        self.db = db
+        self.timeout = timeout
+        self._pending = []  # [(sql, params, Deferred)]
+        self._futures = {}  # (sql, params) -> Deferred，用于去重
+
+    def execute(self, sql, params=None):
+        key = (sql, tuple(params or []))
+        future = self._futures.get(key)
+        if future is None:
+            future = self._futures[key] = Deferred(self)
+            self._pending.append((sql, list(params or []), future))
+        return future
+
+    def flush(self):
+        """
+        把所有待发查询合并成一次 execute_multi 发出
+        批量请求是一个事务，任一条出错 (超时、表不存在等) 整批都失败：此时逐条用 execute 重查，
+        只有出错的那条拿到 None (本地 SQLite 在 result() 时抛出)，与单独查询时一致
+        """
+        pending, self._pending = self._pending, []
+        if not pending: return
+        try:
+            results = self.db.execute_multi([(sql, params) for sql, params, _ in pending], self.timeout)
+        except Exception:
+            results = None
+        for i, (sql, params, future) in enumerate(pending):
+            item = results[i] if results and i < len(results) else None
+            if item and item.get('success'):
+                future._resolve(item)
+                continue
+            try: future._resolve(self.db.execute(sql, params, self.timeout))
+            except Exception as e:
+                future._error, future._done = e, True
+
 d1 = Database()
\ No newline at end of file
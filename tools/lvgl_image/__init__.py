@@ -1 +1,7 @@
-from .routes import lvgl_image_bp
+# 工具包初始化文件
+# 蓝图按需导入：转换子进程只加载 converter / lvgl_utils，不拉起 Flask 路由与数据库
+def __getattr__(name):
+    if name == 'lvgl_image_bp':
+        from .routes import lvgl_image_bp
+        return lvgl_image_bp
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
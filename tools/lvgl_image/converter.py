@@ -0,0 +1,281 @@
+import io
+import os
+import zipfile
+import numpy as np
+from PIL import Image
+from werkzeug.utils import secure_filename
+from .lvgl_utils import LVGLImage, LVGLImageHeader, ColorFormat, CompressMethod, RAWImage, FormatError, ParameterError, LV8_COLOR_FORMATS
+from tools.config import Config
+
+BATCH_IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.webp', '.tga')
+
+
+def parse_convert_options(form, filename):
+    """
+    将 /lvgl_image/convert 的表单参数规范化为纯 dict (可 pickle, 可哈希)
+    """
+    custom_name = form.get('output_name', '').strip()
+    out_name = secure_filename(custom_name if custom_name else os.path.splitext(filename)[0]).replace('-', '_').replace(' ', '_')
+    target_w, target_h = form.get('target_w'), form.get('target_h')
+    opts = {
+        'cf': form.get('cf', 'AUTO'),
+        'ofmt': form.get('ofmt', 'C'),
+        'compress': form.get('compress', 'NONE'),
+        'align': int(form.get('align', 1)),
+        'background': int(form.get('background', '#000000').replace('#', ''), 16),
+        'target_w': int(target_w) if (target_w and target_w.strip()) else None,
+        'target_h': int(target_h) if (target_h and target_h.strip()) else None,
+        'dither': form.get('dither') == 'true',
+        'nemagfx': form.get('nemagfx') == 'true',
+        'premultiply': form.get('premultiply') == 'true',
+        'lv_version': form.get('lv_version', 'v9'),
+        'output_name': out_name,
+    }
+    for k in ('target_w', 'target_h'):
+        # 负数尺寸的像素数为负，会绕过 check_pixels
+        if opts[k] is not None and opts[k] <= 0: raise ParameterError(f"Invalid {k}: {opts[k]}")
+    if opts['ofmt'] == 'C' and opts['lv_version'] == 'v8': check_v8_options(opts)
+    return opts
+
+
+def check_v8_options(opts):
+    """
+    v8 C 数组没有压缩、stride 与预乘标志：AUTO 压缩只能选 NONE，
+    显式 RLE/LZ4、v8 不支持的色彩格式与预乘在提交进程池前抛出 ParameterError (返回 400)
+    """
+    if opts['cf'] in ('RAW', 'RAW_ALPHA'): return
+    if opts['compress'] == 'AUTO': opts['compress'] = 'NONE'
+    if opts['compress'] != 'NONE': raise ParameterError("LVGL v8 does not support compressed images")
+    cf = ColorFormat.__members__.get(opts['cf'])
+    if cf is None: return  # AUTO 只产出索引格式；未知名称交给转换流程报错
+    if cf not in LV8_COLOR_FORMATS: raise ParameterError(f"{cf.name} is not supported by LVGL v8")
+    if opts['premultiply'] and cf.has_alpha: raise ParameterError("LVGL v8 does not support premultiplied images")
+
+
+class ImageTooLarge(ValueError):
+    """源图或目标尺寸超出 LVGL_MAX_PIXELS，调用方返回 413"""
+
+
+def target_size(size, opts):
+    """按 target_w / target_h 计算输出尺寸 (只给一边时保持宽高比)"""
+    (sw, sh), tw, th = size, opts['target_w'], opts['target_h']
+    if tw and th: return tw, th
+    if tw: return tw, max(1, int(sh * (tw / sw)))
+    if th: return max(1, int(sw * (th / sh))), th
+    return sw, sh
+
+
+def check_pixels(size, opts):
+    """解码前按文件头尺寸检查像素预算，避免超大图片拖垮 worker"""
+    for w, h in (size, target_size(size, opts)):
+        if w * h > Config.LVGL_MAX_PIXELS:
+            raise ImageTooLarge(f"Image too large: {w}x{h} > {Config.LVGL_MAX_PIXELS} pixels")
+
+
+def check_bin(data):
+    """
+    解码 .bin 前只读取图像头检查像素预算：解压与 RGBA 缓冲都按头部尺寸分配
+    stride 同样来自文件头，数据长度按每像素 4 字节的预算封顶
+    """
+    header = LVGLImageHeader().from_binary(data)
+    minimal = LVGLImageHeader(header.cf, header.w, header.h).stride_default
+    if header.stride < minimal: raise FormatError(f"Stride is too small: {header.stride}, minimal: {minimal}")
+    check_pixels((header.w, header.h), {'target_w': None, 'target_h': None})
+    if header.stride * header.h > Config.LVGL_MAX_PIXELS * 4:
+        raise ImageTooLarge(f"Image too large: stride {header.stride} x {header.h} rows")
+
+
+def check_upload(data, opts):
+    """
+    提交进程池前只读取文件头检查像素预算，超出抛出 ImageTooLarge
+    RAW 格式不解码；无法识别的图片交给转换流程报错
+    """
+    if opts['cf'] in ('RAW', 'RAW_ALPHA'): return
+    try:
+        with Image.open(io.BytesIO(data)) as img_in: size = img_in.size
+    except Exception: return
+    check_pixels(size, opts)
+
+
+def open_rgba(data, opts):
+    """解码上传图片为 RGBA，按需缩放"""
+    with Image.open(io.BytesIO(data)) as img_in:
+        check_pixels(img_in.size, opts)
+        img_rgba = img_in.convert("RGBA")
+    if opts['target_w'] or opts['target_h']:
+        img_rgba = img_rgba.resize(target_size(img_rgba.size, opts), Image.Resampling.LANCZOS)
+    return img_rgba
+
+
+def pil_bands(img, band_rows):
+    """
+    按行带裁剪并转换为 RGBA 数组。PIL 首次 crop 时会整图解码 (源图模式，如 RGB 每像素 3 字节)，
+    流式的只是 RGBA 转换与打包：省下整图 RGBA 数组与 float 中间结果，多出一个 RGBA 行带
+    """
+    for y in range(0, img.height, band_rows):
+        band = img.crop((0, y, img.width, min(y + band_rows, img.height))).convert("RGBA")
+        yield np.asarray(band)
+
+
+def build_image(data, opts, progress=None):
+    """
+    上传字节 -> LVGLImage (已完成 stride 对齐与预乘)
+    非索引格式：源图整图解码一次，按行带转换 RGBA 并直接打包进对齐后的 stride；
+    缩放时 RGB/L/RGBA 源图按原模式缩放，不再先转出整图 RGBA。索引格式需要整图量化调色板
+    """
+    report = progress or (lambda stage: None)
+    cf = None if opts['cf'] == "AUTO" else ColorFormat[opts['cf']]
+    kwargs = dict(background=opts['background'], rgb565_dither=opts['dither'], nema_gfx=opts['nemagfx'])
+    report('decode')
+    if cf is None or cf.is_indexed:
+        rgba = open_rgba(data, opts)
+        report('pack')
+        img = LVGLImage().from_pil(rgba, cf=cf, **kwargs)
+        report('stride')
+        img.adjust_stride(align=opts['align'])
+    else:
+        with Image.open(io.BytesIO(data)) as img_in:
+            check_pixels(img_in.size, opts)
+            src = img_in
+            if opts['target_w'] or opts['target_h']:
+                # 逐通道缩放，RGB/L 补上的不透明 alpha 不受影响，结果与先转 RGBA 再缩放相同
+                src = img_in if img_in.mode in ('RGB', 'L', 'RGBA') else img_in.convert("RGBA")
+                src = src.resize(target_size(img_in.size, opts), Image.Resampling.LANCZOS)
+            report('pack')
+            img = LVGLImage().from_rgba_bands(pil_bands(src, Config.LVGL_BAND_ROWS), src.width, src.height,
+                                              cf, align=opts['align'], **kwargs)
+        report('stride')
+    if opts['premultiply'] and img.cf.has_alpha: img.premultiply()
+    return img
+
+
+def convert_upload(data, opts, progress=None):
+    """
+    全内存转换：上传字节 -> (下载文件名, 输出字节)，不落盘
+    progress(stage) 依次收到 decode / pack / stride / compress / emit
+    """
+    out_name = opts['output_name']
+    cf = None if opts['cf'] == "AUTO" else ColorFormat[opts['cf']]
+
+    if cf in [ColorFormat.RAW, ColorFormat.RAW_ALPHA]:
+        if progress: progress('emit')
+        img = RAWImage().from_bytes(data, cf=cf)
+        return f"{out_name}.c", img.to_c_array_bytes(outputname=out_name, lv_version=opts['lv_version'])
+
+    if opts['ofmt'] == 'C' and opts['lv_version'] == 'v8':
+        opts = dict(opts, align=1)  # v8 描述符没有 stride，行数据必须紧凑排列
+    img = build_image(data, opts, progress)
+    img.compress_options = {'policy': Config.LVGL_AUTO_POLICY, 'budget': Config.LVGL_AUTO_BUDGET, 'early_ratio': Config.LVGL_AUTO_EARLY_RATIO}
+    compress = CompressMethod[opts['compress']]
+    if opts['ofmt'] == 'C':
+        return f"out_{out_name}.c", img.to_c_array_bytes(out_name, compress=compress, progress=progress, lv_version=opts['lv_version'])
+    return f"out_{out_name}.bin", img.to_bin_bytes(compress=compress, progress=progress)
+
+
+def compress_summary(download_name, data):
+    """
+    从输出内容读取实际使用的压缩方式：.c 取文件头的 AUTO 注释，.bin 读取压缩头
+    """
+    if download_name.endswith('.c'):
+        head = data[:256]
+        start = head.find(b'/* LVGL compress: ')
+        if start < 0: return None
+        return head[start + 18:head.find(b' */', start)].decode('utf-8')
+    if len(data) < 24 or not int.from_bytes(data[2:4], 'little') & 0x08: return 'NONE'
+    method = CompressMethod(int.from_bytes(data[12:16], 'little')).name
+    ratio = int.from_bytes(data[16:20], 'little') / max(1, int.from_bytes(data[20:24], 'little'))
+    return f"{method}; ratio {ratio * 100:.1f}%"
+
+
+def preview_bin(bin_data):
+    """BIN 字节 (可含 RLE/LZ4 压缩) -> (PNG 字节, 图像描述)，按设备端的方式解码"""
+    check_bin(bin_data)
+    img = LVGLImage().from_data(bin_data)
+    info = f"{img.cf.name} {img.w}x{img.h} stride={img.stride}"
+    return img.to_preview_png_bytes(), info
+
+
+def preview_upload(data, opts):
+    """
+    上传图片 -> 按参数转换为 BIN 并解码预览。
+    同时返回 BIN 结果 (下载文件名, 字节)，写入缓存后 /convert 下载 BIN 可直接命中
+    """
+    download_name, bin_data = convert_upload(data, opts)
+    return (download_name, bin_data) + preview_bin(bin_data)
+
+
+# --- 批量转换 ---
+def collect_batch_files(uploads):
+    """
+    展开上传列表：[(filename, bytes)]，其中 .zip 会被解包为内部的图片文件。
+    超出文件数或解压总大小上限时抛出 ValueError
+    """
+    items, total = [], 0
+    max_bytes = Config.LVGL_BATCH_MAX_MB << 20
+    for filename, data in uploads:
+        if filename.lower().endswith('.zip'):
+            with zipfile.ZipFile(io.BytesIO(data)) as zf:
+                for info in zf.infolist():
+                    name = info.filename
+                    if info.is_dir() or name.startswith('__MACOSX/') or not name.lower().endswith(BATCH_IMAGE_EXTS): continue
+                    total += info.file_size
+                    if total > max_bytes: raise ValueError(f"Batch too large (> {Config.LVGL_BATCH_MAX_MB} MB)")
+                    items.append((os.path.basename(name), zf.read(info)))
+        else:
+            total += len(data)
+            if total > max_bytes: raise ValueError(f"Batch too large (> {Config.LVGL_BATCH_MAX_MB} MB)")
+            items.append((filename, data))
+        if len(items) > Config.LVGL_BATCH_MAX_FILES: raise ValueError(f"Too many files (> {Config.LVGL_BATCH_MAX_FILES})")
+    return items
+
+
+def batch_options(form, items):
+    """
+    为每个文件生成转换参数，output_name 取自文件名并去重 (同时也是 C 变量名)
+    重名时追加 _2、_3 ...，跳过已被其他文件占用的名字 (如 img.png, img.png, img_2.png)
+    """
+    form = {k: v for k, v in form.items() if k != 'output_name'}
+    opts_list = [parse_convert_options(form, filename) for filename, _ in items]
+    bases = [opts['output_name'] or 'img' for opts in opts_list]
+    reserved, used = set(bases), set()
+    for opts, base in zip(opts_list, bases):
+        name, n = base, 1
+        # 生成的名字还要避开其他文件本身的名字
+        while name in used or (n > 1 and name in reserved):
+            n += 1
+            name = f"{base}_{n}"
+        opts['output_name'] = name
+        used.add(name)
+    return opts_list
+
+
+def batch_header(guard, names, lv_version='v9'):
+    """聚合头文件：声明批量中的全部图像描述符"""
+    declare = 'LV_IMG_DECLARE' if lv_version == 'v8' else 'LV_IMAGE_DECLARE'
+    guard = guard.upper()
+    lines = [
+        f"#ifndef {guard}_H",
+        f"#define {guard}_H",
+        "",
+        "#ifdef __cplusplus",
+        'extern "C" {',
+        "#endif",
+        "",
+        "#if defined(LV_LVGL_H_INCLUDE_SIMPLE)",
+        '#include "lvgl.h"',
+        "#else",
+        '#include "lvgl/lvgl.h"',
+        "#endif",
+        "",
+    ]
+    lines += [f"{declare}({name});" for name in names]
+    lines += [
+        "",
+        "#ifdef __cplusplus",
+        "} /*extern \"C\"*/",
+        "#endif",
+        "",
+        f"#endif /*{guard}_H*/",
+        "",
+    ]
+    return "\n".join(lines).encode('utf-8')
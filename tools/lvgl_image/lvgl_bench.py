@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Benchmark and regression check for lvgl_utils.
+
+Synthetic images of several sizes and content types are converted with every
+color format, compress method, dither, premultiply and stride combination.
+Each case reports throughput in MPix/s and peak traced memory, and the bytes
+of every output are checked against golden hashes, so a performance refactor
+cannot silently change the converter output.
+
+    python lvgl_bench.py                    # run and check golden hashes
+    python lvgl_bench.py --filter RGB565    # only cases matching a regex
+    python lvgl_bench.py --update-golden    # accept the current output
+"""
+import re
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+import tracemalloc
+from os import path
+
+import numpy as np
+
+try:
+    from .lvgl_utils import LVGLImage, ColorFormat, CompressMethod, PngQuant
+except ImportError:
+    from lvgl_utils import LVGLImage, ColorFormat, CompressMethod, PngQuant
+
+GOLDEN_FILE = path.join(path.dirname(path.abspath(__file__)), "lvgl_bench_golden.json")
+# odd width and height exercise bit packing tails and stride padding
+GOLDEN_SIZES = ((97, 61),)
+BENCH_SIZES = GOLDEN_SIZES + ((800, 480),)
+
+DITHER_FORMATS = (ColorFormat.RGB565, ColorFormat.RGB565_SWAPPED,
+                  ColorFormat.RGB565A8, ColorFormat.ARGB8565)
+PREMULTIPLY_FORMATS = (ColorFormat.I1, ColorFormat.I2, ColorFormat.I4,
+                       ColorFormat.I8, ColorFormat.ARGB8888,
+                       ColorFormat.RGB565A8, ColorFormat.ARGB8565)
+ALIGNS = (1, 16)
+
+
+# --- synthetic images, HxWx4 uint8 RGBA, deterministic for golden hashes ---
+def image_flat(w, h, rng):
+    pixels = np.empty((h, w, 4), dtype=np.uint8)
+    pixels[...] = (0x2a, 0x7f, 0xd4, 0xff)
+    return pixels
+
+
+def image_gradient(w, h, rng):
+    x = np.linspace(0, 255, w, dtype=np.float32)[None, :]
+    y = np.linspace(0, 255, h, dtype=np.float32)[:, None]
+    pixels = np.empty((h, w, 4), dtype=np.uint8)
+    pixels[..., 0] = x
+    pixels[..., 1] = y
+    pixels[..., 2] = (x + y) / 2
+    pixels[..., 3] = 255
+    return pixels
+
+
+def image_noise(w, h, rng):
+    return rng.integers(0, 256, (h, w, 4), dtype=np.uint8)
+
+
+def image_photo(w, h, rng):
+    """
+    Smooth low frequency color fields with sharp edges and a little grain
+    """
+    coarse = rng.random((h // 16 + 2, w // 16 + 2, 3), dtype=np.float32)
+    ys = np.linspace(0, coarse.shape[0] - 1.001, h)
+    xs = np.linspace(0, coarse.shape[1] - 1.001, w)
+    y0, x0 = ys.astype(int), xs.astype(int)
+    fy, fx = (ys - y0)[:, None, None], (xs - x0)[None, :, None]
+    top = coarse[y0][:, x0] * (1 - fx) + coarse[y0][:, x0 + 1] * fx
+    bottom = coarse[y0 + 1][:, x0] * (1 - fx) + coarse[y0 + 1][:, x0 + 1] * fx
+    field = (top * (1 - fy) + bottom * fy) * 220
+    field[h // 3:h // 2, w // 4:] += 30  # edge
+    field += rng.normal(0, 3, field.shape)
+    pixels = np.empty((h, w, 4), dtype=np.uint8)
+    pixels[..., :3] = np.clip(field, 0, 255)
+    pixels[..., 3] = 255
+    return pixels
+
+
+def image_alpha(w, h, rng):
+    """
+    Soft edged discs on a transparent background, like anti-aliased icons
+    """
+    pixels = image_gradient(w, h, rng)
+    yy, xx = np.mgrid[0:h, 0:w]
+    alpha = np.zeros((h, w), dtype=np.float32)
+    for cx, cy, r in rng.random((6, 3)):
+        dist = np.hypot(xx - cx * w, yy - cy * h)
+        alpha = np.maximum(alpha, np.clip(r * min(w, h) / 3 - dist, 0, 1.5) / 1.5)
+    pixels[..., 3] = alpha * 255
+    return pixels
+
+
+CONTENTS = {
+    "flat": image_flat,
+    "gradient": image_gradient,
+    "noise": image_noise,
+    "photo": image_photo,
+    "alpha": image_alpha,
+}
+
+
+def make_image(content, w, h):
+    # seed from the case, so a subset of cases yields the same images
+    seed = int.from_bytes(hashlib.sha256(f"{content}{w}x{h}".encode()).digest()[:4], "little")
+    return CONTENTS[content](w, h, np.random.default_rng(seed))
+
+
+def cases(sizes, contents, formats):
+    """
+    Yield (key, w, h, content, cf, dither, premultiply, align)
+    """
+    for w, h in sizes:
+        for content in contents:
+            for cf in formats:
+                for dither in ((False, True) if cf in DITHER_FORMATS else (False,)):
+                    for premultiply in ((False, True) if cf in PREMULTIPLY_FORMATS else (False,)):
+                        for align in ALIGNS:
+                            key = f"{w}x{h}/{content}/{cf.name}"
+                            key += "/dither" if dither else ""
+                            key += "/premultiply" if premultiply else ""
+                            key += f"/align{align}"
+                            yield key, w, h, content, cf, dither, premultiply, align
+
+
+def run_case(pixels, cf, dither, premultiply, align, compress, repeat):
+    """
+    Convert pixels to '.bin' content, return (image, output, best seconds,
+    peak bytes)
+    """
+    best = None
+    for _ in range(repeat):
+        PngQuant._cache.clear()  # time the quantization, not the cache
+        start = time.perf_counter()
+        img = LVGLImage().from_rgba(pixels, cf, rgb565_dither=dither)
+        img.adjust_stride(align=align)
+        if premultiply:
+            img.premultiply()
+        output = img.to_bin_bytes(compress)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    # memory is traced in a separate run, tracing slows down allocation
+    PngQuant._cache.clear()
+    tracemalloc.start()
+    img = LVGLImage().from_rgba(pixels, cf, rgb565_dither=dither)
+    img.adjust_stride(align=align)
+    if premultiply:
+        img.premultiply()
+    img.to_bin_bytes(compress)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return img, output, best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LVGL image converter benchmark.")
+    parser.add_argument("--sizes", default=",".join(f"{w}x{h}" for w, h in BENCH_SIZES),
+                        help=("comma separated WxH list, golden hashes are kept for "
+                              f"{','.join(f'{w}x{h}' for w, h in GOLDEN_SIZES)}"))
+    parser.add_argument("--contents", default=",".join(CONTENTS),
+                        help=f"comma separated subset of {','.join(CONTENTS)}")
+    parser.add_argument("--compress", default="NONE,RLE,LZ4,AUTO",
+                        help="comma separated compress methods")
+    parser.add_argument("--filter", default=None, metavar="regex",
+                        help="only run cases whose key matches regex")
+    parser.add_argument("--repeat", default=3, type=int,
+                        help="runs per case, the fastest is reported")
+    parser.add_argument("--golden", default=GOLDEN_FILE,
+                        help="golden hash file")
+    parser.add_argument("--update-golden", action="store_true",
+                        help="write the hashes of this run to the golden file")
+    parser.add_argument("--json", default=None, metavar="file",
+                        help="also write the results as json")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    sizes = [tuple(int(v) for v in s.split("x")) for s in args.sizes.split(",")]
+    contents = args.contents.split(",")
+    methods = [CompressMethod[m] for m in args.compress.split(",")]
+    formats = [cf for cf in ColorFormat
+               if cf not in (ColorFormat.UNKNOWN, ColorFormat.RAW, ColorFormat.RAW_ALPHA)]
+    pattern = re.compile(args.filter) if args.filter else None
+
+    golden = {}
+    if path.exists(args.golden):
+        with open(args.golden, "r", encoding="utf-8") as f:
+            golden = json.load(f)
+
+    results, hashes, mismatched, new, broken = [], {}, [], [], []
+    source, pixels = None, None
+    print(f"{'case':<58} {'compress':>8} {'MPix/s':>8} {'ms':>8} {'peak KiB':>9} {'ratio':>7}")
+    for key, w, h, content, cf, dither, premultiply, align in cases(sizes, contents, formats):
+        if pattern and not pattern.search(key):
+            continue
+        if source != (content, w, h):
+            source, pixels = (content, w, h), make_image(content, w, h)
+
+        for compress in methods:
+            img, output, seconds, peak = run_case(pixels, cf, dither, premultiply,
+                                                  align, compress, args.repeat)
+            digest = hashlib.sha256(output).hexdigest()[:16]
+            case = f"{key}/{compress.name}"
+            hashes[case] = digest
+            raw = img.data_len + 12
+            result = {
+                "case": case,
+                "mpix_s": round(w * h / seconds / 1e6, 3),
+                "ms": round(seconds * 1000, 3),
+                "peak_kib": round(peak / 1024, 1),
+                "ratio": round(len(output) / raw, 4),
+                "hash": digest,
+            }
+            results.append(result)
+            flag = ""
+            try:
+                # the output must decode back to the image, like on device
+                back = LVGLImage().from_data(output)
+                decoded = (back.stride, bytes(back.data)) == (img.stride, bytes(img.data))
+            except Exception:
+                decoded = False
+            if not decoded:
+                broken.append(case)
+                flag = " BROKEN"
+            elif case not in golden:
+                new.append(case)
+                flag = " new"
+            elif golden[case] != digest:
+                mismatched.append(case)
+                flag = " CHANGED"
+            print(f"{key:<58} {compress.name:>8} {result['mpix_s']:>8.2f} "
+                  f"{result['ms']:>8.2f} {result['peak_kib']:>9.1f} "
+                  f"{result['ratio'] * 100:>6.1f}%{flag}")
+
+    total = sum(r["ms"] for r in results)
+    print(f"\n{len(results)} cases, {total / 1000:.2f}s total (best of {args.repeat})")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+
+    if args.update_golden and not broken:
+        golden.update(hashes)
+        with open(args.golden, "w", encoding="utf-8") as f:
+            json.dump(golden, f, indent=0, sort_keys=True)
+            f.write("\n")
+        print(f"golden hashes updated: {len(hashes)} cases -> {args.golden}")
+        return 0
+
+    if new:
+        print(f"{len(new)} cases without golden hash, not checked")
+    if broken:
+        print(f"{len(broken)} cases do not decode back to the image:")
+        for case in broken:
+            print(f"  {case}")
+    if mismatched:
+        print(f"{len(mismatched)} cases changed output:")
+        for case in mismatched:
+            print(f"  {case}")
+    return 1 if broken or mismatched else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
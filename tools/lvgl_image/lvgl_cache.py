@@ -0,0 +1,114 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from tools.config import Config
+
+# 转换器版本：同样参数下输出字节有变化时 (如修复编码器) 加一，磁盘层跨部署保留，旧结果随之失效
+CACHE_VERSION = 1
+
+
+class ConversionCache:
+    """
+    LVGL 转换结果缓存 (内容寻址)：
+    key = sha256(转换器版本 + 上传字节 + 全部转换参数)，value = (下载文件名, 输出字节)
+    - 内存层：LRU，按条目数与总字节数双重限制
+    - 磁盘层：可选，按总字节数上限淘汰最久未使用的文件
+    """
+
+    def __init__(self, max_items=256, max_bytes=64 << 20, disk_dir=None, disk_max_bytes=512 << 20):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._lock = threading.Lock()
+        self._mem = OrderedDict()
+        self._mem_bytes = 0
+        self._disk_bytes = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._disk_bytes = sum(e.stat().st_size for e in os.scandir(disk_dir) if e.is_file())
+
+    @staticmethod
+    def make_key(data, opts):
+        h = hashlib.sha256(f"lvgl-v{CACHE_VERSION}\0".encode('utf-8'))
+        h.update(data)
+        h.update(json.dumps(opts, sort_keys=True).encode('utf-8'))
+        return h.hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._mem:
+                self._mem.move_to_end(key)
+                return self._mem[key]
+        entry = self._disk_get(key)
+        if entry: self._mem_put(key, entry)
+        return entry
+
+    def put(self, key, name, data):
+        entry = (name, data)
+        self._mem_put(key, entry)
+        self._disk_put(key, entry)
+
+    def _mem_put(self, key, entry):
+        size = len(entry[1])
+        if size > self.max_bytes: return
+        with self._lock:
+            if key in self._mem:
+                self._mem.move_to_end(key)
+                return
+            self._mem[key] = entry
+            self._mem_bytes += size
+            while len(self._mem) > self.max_items or self._mem_bytes > self.max_bytes:
+                _, (_, old) = self._mem.popitem(last=False)
+                self._mem_bytes -= len(old)
+
+    # --- 磁盘层：文件内容为 "下载文件名\n" + 输出字节 ---
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key)
+
+    def _disk_get(self, key):
+        if not self.disk_dir: return None
+        fpath = self._disk_path(key)
+        try:
+            with open(fpath, 'rb') as f: raw = f.read()
+            os.utime(fpath)  # 刷新 mtime，作为 LRU 依据
+        except OSError: return None
+        name, _, data = raw.partition(b'\n')
+        return name.decode('utf-8'), data
+
+    def _disk_put(self, key, entry):
+        if not self.disk_dir: return
+        name, data = entry
+        raw = name.encode('utf-8') + b'\n' + data
+        if len(raw) > self.disk_max_bytes: return
+        fpath = self._disk_path(key)
+        try:
+            if os.path.exists(fpath): return
+            tmp = f"{fpath}.{threading.get_ident()}.tmp"
+            with open(tmp, 'wb') as f: f.write(raw)
+            os.replace(tmp, fpath)
+            with self._lock:
+                self._disk_bytes += len(raw)
+                if self._disk_bytes > self.disk_max_bytes: self._disk_evict()
+        except OSError as e:
+            print(f"⚠️ [LVGL Cache] disk write fail: {e}")
+
+    def _disk_evict(self):
+        entries = sorted((e for e in os.scandir(self.disk_dir) if e.is_file() and not e.name.endswith('.tmp')), key=lambda e: e.stat().st_mtime)
+        for e in entries:
+            if self._disk_bytes <= self.disk_max_bytes: break
+            try:
+                size = e.stat().st_size
+                os.remove(e.path)
+                self._disk_bytes -= size
+            except OSError: pass
+
+
+conversion_cache = ConversionCache(
+    max_items=Config.LVGL_CACHE_ITEMS,
+    max_bytes=Config.LVGL_CACHE_MB << 20,
+    disk_dir=Config.LVGL_CACHE_DIR,
+    disk_max_bytes=Config.LVGL_CACHE_DISK_MB << 20,
+)
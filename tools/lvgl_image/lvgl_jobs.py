@@ -0,0 +1,68 @@
+import time
+import uuid
+import threading
+from tools.config import Config
+
+# convert_upload 依次上报的阶段，用于计算进度百分比
+STAGES = ('decode', 'pack', 'stride', 'compress', 'emit')
+
+
+class JobStore:
+    """
+    异步转换任务表 (进程内)：job_id -> 提交者 + 进程池任务 + 结果
+    自提交起保留 ttl 秒 (运行中的任务不清理)，过期条目在下次访问时清理
+    不跨进程共享：/jobs 接口要求单个 Web worker 进程，多进程时轮询会随机 404
+    """
+
+    def __init__(self, ttl=600):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def add(self, owner, job=None, result=None):
+        """登记任务；缓存命中时直接传入 result=(下载文件名, 输出字节)"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._purge(now)
+            self._jobs[job_id] = {'owner': owner, 'job': job, 'result': result, 'created': now}
+        return job_id
+
+    def get(self, job_id, owner):
+        with self._lock:
+            self._purge(time.time())
+            entry = self._jobs.get(job_id)
+        if not entry or entry['owner'] != owner: return None
+        return entry
+
+    def status(self, entry):
+        job, now = entry['job'], time.time()
+        if job is None:
+            return {'status': 'done', 'stage': 'done', 'progress': 100, 'elapsed': 0}
+        if job.done.is_set():
+            status = 'error' if job.error else 'done'
+        else:
+            status = 'queued' if job.started is None else 'running'
+        data = {
+            'status': status,
+            'stage': job.stage,
+            'progress': 100 if status == 'done' else (int(100 * STAGES.index(job.stage) / len(STAGES)) if job.stage in STAGES else 0),
+            'elapsed': round(now - entry['created'], 2),
+        }
+        if job.error: data['error'] = str(job.error)
+        if status in ('done', 'error'): data['expires_in'] = max(0, int(entry['created'] + self.ttl - now))
+        return data
+
+    def result(self, entry):
+        if entry['job'] is None: return entry['result']
+        job = entry['job']
+        return job.result if job.done.is_set() and not job.error else None
+
+    def _purge(self, now):
+        # 仅清理已结束的任务：仍在运行的任务在结束后再计 TTL
+        expired = [k for k, e in self._jobs.items()
+                   if now - e['created'] > self.ttl and (e['job'] is None or e['job'].done.is_set())]
+        for k in expired: del self._jobs[k]
+
+
+job_store = JobStore(ttl=Config.LVGL_JOB_TTL)
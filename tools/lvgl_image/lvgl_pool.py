@@ -0,0 +1,235 @@
+import sys
+import math
+import time
+import queue
+import pickle
+import threading
+import multiprocessing
+from collections import deque
+from tools.config import Config
+
+
+# 拉起子进程期间会临时替换 sys.modules['__main__']，多个调度线程需串行
+_spawn_lock = threading.Lock()
+
+
+class PoolBusy(Exception):
+    """队列已满，调用方应返回 429 + Retry-After"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Converter busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class JobTimeout(Exception):
+    pass
+
+
+def _portable_error(e):
+    """能 pickle 往返的 Exception 原样回传，调用方可按类型处理 (如参数错误返回 400)；其余转为 RuntimeError"""
+    if isinstance(e, Exception):
+        try:
+            pickle.loads(pickle.dumps(e))
+            return e
+        except Exception: pass
+    return RuntimeError(str(e) or type(e).__name__)
+
+
+def _worker_main(conn):
+    """
+    子进程循环：接收 (func, args, track)，回传 ('ok', result) 或 ('error', exception)
+    track 为真时以 progress 关键字传入回调，执行中回传 ('progress', stage)
+    """
+    report = lambda stage: conn.send(('progress', stage))
+    while True:
+        try:
+            func, args, track = conn.recv()
+        except EOFError:
+            return
+        try:
+            conn.send(('ok', func(*args, progress=report) if track else func(*args)))
+        except BaseException as e:
+            # 任何异常都必须回复 (PngQuant 抛出的是 BaseException)，否则调用方只能等到进程被判定崩溃
+            conn.send(('error', _portable_error(e)))
+            if isinstance(e, (KeyboardInterrupt, SystemExit)): raise
+
+
+class _Job:
+    __slots__ = ('func', 'args', 'timeout', 'track', 'on_done', 'stage', 'submitted', 'started', 'finished', 'result', 'error', 'done')
+
+    def __init__(self, func, args, timeout, track=False, on_done=None):
+        self.func, self.args, self.timeout = func, args, timeout
+        self.track, self.on_done = track, on_done
+        self.stage = 'queued'
+        self.submitted, self.started, self.finished = time.monotonic(), None, None
+        self.result = self.error = None
+        self.done = threading.Event()
+
+    def wait(self):
+        self.done.wait()
+        if self.error: raise self.error
+        return self.result
+
+
+class ConversionPool:
+    """
+    LVGL 转换专用进程池：
+    - 常驻 spawn 子进程，每个子进程由一个调度线程独占驱动；子进程入口为 lvgl_worker，不导入 app.py
+    - 有界等待队列，满时抛出 PoolBusy (调用方返回 429)
+    - 单任务超时直接 kill 子进程并重新拉起，避免超大 target_w/target_h 拖死 worker
+    - workers=0 时在调用线程内同步执行 (无法创建子进程的 Serverless 环境)
+    """
+
+    def __init__(self, workers=2, max_queue=8, timeout=60):
+        self.workers = workers
+        self.timeout = timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._started = False
+        self._busy = 0
+        self._service = deque(maxlen=256)
+        self._wait = deque(maxlen=256)
+        self._counts = {'completed': 0, 'failed': 0, 'timeouts': 0, 'rejected': 0, 'restarts': 0}
+
+    # --- 对外接口 ---
+    def submit(self, func, *args, block=False, timeout=None, track=False, on_done=None):
+        """
+        提交任务，返回 job (job.wait() 取结果)。
+        block=False 时队列满立即抛出 PoolBusy；block=True 时最多等待 timeout 秒
+        track=True 时 func 需接受 progress 关键字，阶段名写入 job.stage
+        on_done(job) 在任务结束后于调度线程中调用
+        """
+        job = _Job(func, args, self.timeout, track, on_done)
+        if self.workers <= 0:
+            self._run_inline(job)
+            return job
+        self._ensure_started()
+        try:
+            self._queue.put(job, block=block, timeout=timeout if block else None)
+        except queue.Full:
+            with self._lock: self._counts['rejected'] += 1
+            raise PoolBusy(self.retry_after())
+        return job
+
+    def run(self, func, *args):
+        return self.submit(func, *args).wait()
+
+    def retry_after(self):
+        """按当前排队数与平均耗时估算的重试秒数"""
+        with self._lock:
+            avg = sum(self._service) / len(self._service) if self._service else 1.0
+        backlog = self._queue.qsize() + 1
+        return max(1, math.ceil(backlog * avg / max(1, self.workers)))
+
+    def stats(self):
+        with self._lock:
+            service, wait = sorted(self._service), sorted(self._wait)
+            data = dict(self._counts, busy=self._busy)
+        pct = lambda xs, p: round(xs[min(len(xs) - 1, int(len(xs) * p))], 4) if xs else 0
+        data.update(
+            workers=self.workers,
+            queue_depth=self._queue.qsize(),
+            queue_max=self._queue.maxsize,
+            timeout=self.timeout,
+            service_avg=round(sum(service) / len(service), 4) if service else 0,
+            service_p95=pct(service, 0.95),
+            wait_avg=round(sum(wait) / len(wait), 4) if wait else 0,
+            wait_p95=pct(wait, 0.95),
+        )
+        return data
+
+    # --- 内部实现 ---
+    def _ensure_started(self):
+        if self._started: return
+        with self._lock:
+            if self._started: return
+            for i in range(self.workers):
+                threading.Thread(target=self._dispatch, name=f"lvgl-pool-{i}", daemon=True).start()
+            self._started = True
+
+    def _spawn(self):
+        from . import lvgl_worker
+        ctx = multiprocessing.get_context('spawn')
+        parent, child = ctx.Pipe()
+        proc = ctx.Process(target=_worker_main, args=(child,), daemon=True)
+        # spawn 会在子进程中重新导入 __main__ (通常是 app.py)，启动期间换成轻量入口模块
+        with _spawn_lock:
+            main = sys.modules['__main__']
+            sys.modules['__main__'] = lvgl_worker
+            try: proc.start()
+            finally: sys.modules['__main__'] = main
+        child.close()
+        return proc, parent
+
+    def _kill(self, proc, conn):
+        conn.close()
+        proc.kill()
+        proc.join()
+        with self._lock: self._counts['restarts'] += 1
+
+    def _dispatch(self):
+        proc, conn = self._spawn()
+        while True:
+            job = self._queue.get()
+            self._begin(job)
+            try:
+                conn.send((job.func, job.args, job.track))
+                deadline = job.started + job.timeout
+                kind = 'progress'
+                while kind == 'progress':
+                    if not conn.poll(max(0, deadline - time.monotonic())): break
+                    kind, payload = conn.recv()
+                    if kind == 'progress': job.stage = payload
+                if kind == 'progress':
+                    self._kill(proc, conn)
+                    proc, conn = self._spawn()
+                    self._finish(job, error=JobTimeout(f"Conversion timed out after {job.timeout}s"))
+                    continue
+            except (EOFError, OSError) as e:
+                # 子进程异常退出 (如 OOM)，重新拉起
+                self._kill(proc, conn)
+                proc, conn = self._spawn()
+                self._finish(job, error=RuntimeError(f"Worker crashed: {e}"))
+                continue
+            if kind == 'ok': self._finish(job, result=payload)
+            else: self._finish(job, error=payload)
+
+    def _run_inline(self, job):
+        self._begin(job)
+        try:
+            if job.track:
+                self._finish(job, result=job.func(*job.args, progress=lambda stage: setattr(job, 'stage', stage)))
+            else:
+                self._finish(job, result=job.func(*job.args))
+        except BaseException as e:
+            # 与子进程一致：任何异常都结束任务，否则 _busy 不归还、job.wait() 永远阻塞
+            self._finish(job, error=e if isinstance(e, Exception) else _portable_error(e))
+            if isinstance(e, (KeyboardInterrupt, SystemExit)): raise
+
+    def _begin(self, job):
+        job.started = time.monotonic()
+        job.stage = 'running'
+        with self._lock:
+            self._busy += 1
+            self._wait.append(job.started - job.submitted)
+
+    def _finish(self, job, result=None, error=None):
+        job.result, job.error = result, error
+        job.finished = time.monotonic()
+        job.stage = 'error' if error else 'done'
+        with self._lock:
+            self._busy -= 1
+            self._service.append(job.finished - job.started)
+            if isinstance(error, JobTimeout): self._counts['timeouts'] += 1
+            self._counts['failed' if error else 'completed'] += 1
+        if job.on_done:
+            try: job.on_done(job)
+            except Exception as e: print(f"⚠️ [LVGL Pool] on_done fail: {e}")
+        job.done.set()
+
+
+conversion_pool = ConversionPool(
+    workers=Config.LVGL_POOL_WORKERS,
+    max_queue=Config.LVGL_POOL_QUEUE,
+    timeout=Config.LVGL_JOB_TIMEOUT,
+)
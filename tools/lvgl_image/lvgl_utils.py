@@ -1,10 +1,20 @@
 #!/usr/bin/env python3
+import io
 import os
 import logging
 import argparse
+import bisect
+import zlib
+import struct
+import json
+import hashlib
+import functools
+import threading
 import subprocess
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from os import path
 from enum import Enum
+from collections import OrderedDict
 from typing import List
 from pathlib import Path
 
@@ -18,6 +28,11 @@ try:
 except ImportError:
     raise ImportError("Need lz4 package, do `pip3 install lz4`")
 
+try:
+    import numpy as np
+except ImportError:
+    raise ImportError("Need numpy package, do `pip3 install numpy`")
+
 
 def uint8_t(val) -> bytes:
     return val.to_bytes(1, byteorder='little')
@@ -49,6 +64,191 @@ def color_pre_multiply(r, g, b, a, background):
             (b * a + (255 - a) * bb) >> 8, a)
 
 
+def array_pre_multiply(pixels, background):
+    """
+    Same as color_pre_multiply, but for the whole HxWx4 RGBA array at once.
+    Return the blended r, g, b channels as uint16 arrays.
+    """
+    a = pixels[..., 3].astype(np.uint16)
+    na = 255 - a
+    bgs = ((background >> 16) & 0xff, (background >> 8) & 0xff,
+           background & 0xff)
+    return tuple((pixels[..., i] * a + na * bgs[i]) >> 8 for i in range(3))
+
+
+def srgb_to_linear(x):
+    if x < 0.04045:
+        return x / 12.92
+    return pow((x + 0.055) / 1.055, 2.4)
+
+
+def linear_to_srgb(y):
+    if y <= 0.0031308:
+        return 12.92 * y
+    return 1.055 * pow(y, 1 / 2.4) - 0.055
+
+
+def _linear_to_srgb_byte(y):
+    return int(linear_to_srgb(y) * 255)
+
+
+@functools.lru_cache(maxsize=None)
+def srgb_luma_tables():
+    """
+    Return (sRGB to linear table with 256 entries, 255 linear thresholds).
+    thresholds[k - 1] is the smallest double y with int(linear_to_srgb(y) * 255)
+    >= k, found by bisecting the bit pattern of non-negative doubles, so the
+    table lookup gives exactly the same byte as the pow() based conversion.
+    """
+    to_bits = lambda f: struct.unpack('<q', struct.pack('<d', f))[0]
+    to_float = lambda i: struct.unpack('<d', struct.pack('<q', i))[0]
+
+    lin = np.array([srgb_to_linear(i / 255.0) for i in range(256)])
+    thresholds = []
+    for k in range(1, 256):
+        lo, hi = 0, to_bits(2.0)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if _linear_to_srgb_byte(to_float(mid)) >= k:
+                hi = mid
+            else:
+                lo = mid + 1
+        thresholds.append(to_float(lo))
+    return lin, np.array(thresholds)
+
+
+def array_luma(r, g, b):
+    """
+    ITU-R BT.709 luminance byte of whole r, g, b channel arrays, same as
+    int(linear_to_srgb(0.2126 * R + 0.7152 * G + 0.0722 * B) * 255) per pixel
+    """
+    lin, thresholds = srgb_luma_tables()
+    luma = 0.2126 * lin[r] + 0.7152 * lin[g] + 0.0722 * lin[b]
+    return np.searchsorted(thresholds, luma, side='right').astype(np.uint8)
+
+
+def read_png_rgba(filename):
+    """
+    Decode png file once into a HxWx4 uint8 RGBA array
+    """
+    reader = png.Reader(str(filename))
+    w, h, rows, info = reader.asRGBA8()
+    pixels = np.empty((h, w * 4), dtype=np.uint8)
+    for y, row in enumerate(rows):
+        pixels[y] = row
+    return pixels.reshape(h, w, 4), info
+
+
+def tile_threshold(thresh: List, h: int, w: int, y0: int = 0):
+    """
+    Tile the 8x8 ordered dither threshold matrix over a HxW image, the
+    image top row is row y0 of the whole picture
+    """
+    matrix = np.array(thresh, dtype=np.uint16).reshape(8, 8)
+    matrix = np.roll(matrix, -(y0 & 7), axis=0)
+    return np.tile(matrix, ((h + 7) // 8, (w + 7) // 8))[:h, :w]
+
+
+def dither_rgb565(pixels, y0: int = 0):
+    """
+    Apply the RGB565 ordered dither to the whole HxWx4 RGBA array at once.
+    The alpha channel is kept as is.
+    """
+    h, w = pixels.shape[:2]
+    out = pixels.copy()
+    for i, (thresh, mask) in enumerate(((red_thresh, 0xF8),
+                                        (green_thresh, 0xFC),
+                                        (blue_thresh, 0xF8))):
+        c = pixels[..., i] + tile_threshold(thresh, h, w, y0)
+        out[..., i] = np.minimum(c, 0xFF) & mask
+    return out
+
+
+def pack_colormap(pixels, cf, background: int = 0x00_00_00,
+                  rgb565_dither=False, y0: int = 0) -> bytearray:
+    """
+    Pack HxWx4 RGBA array to lvgl color map with whole-array operations.
+    Output is the same as packing pixel by pixel in LVGLImage._png_to_colormap
+    y0 is the row of the array top row in the whole image, for dithering
+    """
+    if rgb565_dither and cf in (ColorFormat.RGB565,
+                                ColorFormat.RGB565_SWAPPED,
+                                ColorFormat.RGB565A8, ColorFormat.ARGB8565):
+        pixels = dither_rgb565(pixels, y0)
+
+    r, g, b, a = (pixels[..., i] for i in range(4))
+    if cf in (ColorFormat.XRGB8888, ColorFormat.RGB888, ColorFormat.RGB565,
+              ColorFormat.RGB565_SWAPPED):
+        r, g, b = array_pre_multiply(pixels, background)
+
+    if cf == ColorFormat.ARGB8888:
+        out = pixels[..., [2, 1, 0, 3]]
+    elif cf == ColorFormat.ARGB8888_PREMULTIPLIED:
+        a16 = a.astype(np.uint16)
+        out = np.stack((b * a16 // 255, g * a16 // 255, r * a16 // 255, a16),
+                       axis=-1).astype(np.uint8)
+    elif cf == ColorFormat.XRGB8888:
+        out = np.stack((b, g, r, np.full_like(b, 0xff)),
+                       axis=-1).astype(np.uint8)
+    elif cf == ColorFormat.RGB888:
+        out = np.stack((b, g, r), axis=-1).astype(np.uint8)
+    elif cf in (ColorFormat.RGB565, ColorFormat.RGB565_SWAPPED,
+                ColorFormat.RGB565A8, ColorFormat.ARGB8565):
+        color = (r.astype(np.uint16) >> 3) << 11
+        color |= (g.astype(np.uint16) >> 2) << 5
+        color |= (b.astype(np.uint16) >> 3)
+        if cf == ColorFormat.RGB565_SWAPPED:
+            out = color.astype('>u2')
+        elif cf == ColorFormat.ARGB8565:
+            out = np.stack((color & 0xff, color >> 8, a),
+                           axis=-1).astype(np.uint8)
+        else:
+            out = color.astype('<u2')
+    else:
+        raise FormatError(f"Invalid color format: {cf.name}")
+
+    rawdata = bytearray(out.tobytes())
+    if cf == ColorFormat.RGB565A8:
+        rawdata += a.tobytes()
+    return rawdata
+
+
+def pack_rgba(pixels, cf, background: int = 0x00_00_00,
+              rgb565_dither=False, y0: int = 0) -> bytes:
+    """
+    Pack HxWx4 RGBA array to a non-indexed cf, rows at default stride.
+    RGB565A8 returns the color map followed by the alpha map.
+    """
+    if cf.is_alpha_only:
+        return pack_bits(pixels[..., 3] >> (8 - cf.bpp), cf.bpp)
+    if cf == ColorFormat.AL88:
+        # Calculate luminance using ITU-R BT.709 coefficients
+        # AL88: low byte = luminance, high byte = alpha
+        return np.stack((array_luma(pixels[..., 0], pixels[..., 1],
+                                    pixels[..., 2]), pixels[..., 3]),
+                        axis=-1).tobytes()
+    if cf.is_luma_only:
+        r, g, b = array_pre_multiply(pixels, background)
+        return array_luma(r, g, b).tobytes()
+    if cf.is_colormap:
+        return pack_colormap(pixels, cf, background, rgb565_dither, y0)
+    raise FormatError(f"Invalid color format: {cf.name}")
+
+
+def rgba_row_bands(rows, w: int, band_rows: int = 64):
+    """
+    Group an iterable of flat RGBA8 rows (pypng asRGBA8) into HxWx4 bands
+    """
+    band = []
+    for row in rows:
+        band.append(row)
+        if len(band) == band_rows:
+            yield np.asarray(band, dtype=np.uint8).reshape(len(band), w, 4)
+            band = []
+    if band:
+        yield np.asarray(band, dtype=np.uint8).reshape(len(band), w, 4)
+
+
 class Error(Exception):
 
     def __str__(self):
@@ -71,35 +271,105 @@ class ParameterError(Error):
 class PngQuant:
     """
     Compress PNG file to 8bit mode using `Pillow` (Replaced pngquant for portability)
+    Quantized results are kept in a small LRU cache keyed by
+    (image hash, ncolors, dither), shared by all instances.
     """
 
+    cache_size = 16
+    _cache = OrderedDict()
+    _cache_lock = threading.Lock()
+
     def __init__(self, ncolors=256, dither=True, exec_path="") -> None:
         self.ncolors = ncolors
         self.dither = dither
 
     def convert(self, filename) -> bytes:
         from PIL import Image
-        import io
         try:
             with Image.open(filename) as img:
-                # 确保是 RGBA 模式
-                img = img.convert("RGBA")
-                # 使用 Pillow 的自适应调色板进行量化
-                dither_mode = Image.FLOYDSTEINBERG if self.dither else Image.NONE
-                img_p = img.convert("P", palette=Image.ADAPTIVE, colors=self.ncolors, dither=dither_mode)
-                
-                # 将量化后的图片保存到内存字节流中，模拟原来的文件输出
-                buf = io.BytesIO()
-                img_p.save(buf, format="PNG")
-                return buf.getvalue()
+                return self.quantize(img)
         except Exception as e:
             raise BaseException(f"图像量化失败 (Pillow): {e}")
 
+    def _quantize_p(self, img):
+        from PIL import Image
+        # 确保是 RGBA 模式
+        img = img.convert("RGBA")
+        # 使用 Pillow 的自适应调色板进行量化
+        dither_mode = Image.FLOYDSTEINBERG if self.dither else Image.NONE
+        return img.convert("P", palette=Image.ADAPTIVE, colors=self.ncolors, dither=dither_mode)
+
+    def quantize(self, img) -> bytes:
+        """
+        Quantize PIL image, return the 8bit mode PNG file content
+        """
+        import io
+        try:
+            img_p = self._quantize_p(img)
+
+            # 将量化后的图片保存到内存字节流中，模拟原来的文件输出
+            buf = io.BytesIO()
+            img_p.save(buf, format="PNG")
+            return buf.getvalue()
+        except Exception as e:
+            raise BaseException(f"图像量化失败 (Pillow): {e}")
+
+    def quantize_indexed(self, img):
+        """
+        Quantize PIL image without PNG encoding, return (palette, indices):
+        palette as [(R, G, B, A), ...] and HxW uint8 index array (read only),
+        the same as reading back the PNG from quantize() with pypng
+        """
+        try:
+            img = img.convert("RGBA")
+            h = hashlib.sha256(img.tobytes())
+            key = (h.hexdigest(), img.size, self.ncolors, self.dither)
+            with self._cache_lock:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    return self._cache[key]
+
+            img_p = self._quantize_p(img)
+            result = (self._png_palette(img_p), np.asarray(img_p, dtype=np.uint8))
+            result[1].flags.writeable = False
+            with self._cache_lock:
+                self._cache[key] = result
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            return result
+        except Exception as e:
+            raise FormatError(f"图像量化失败 (Pillow): {e}") from e
+
+    @staticmethod
+    def _png_palette(img_p) -> List:
+        """
+        Palette entries as Pillow writes them to PLTE and tRNS, alpha
+        forced to 255 where tRNS has no value
+        """
+        rgb = img_p.getpalette() or []
+        colors = max(min(len(rgb) // 3, 256), 1) if img_p.palette else 256
+        rgb = (list(rgb) + [0] * (colors * 3))[:colors * 3]
+
+        alpha = b""
+        transparency = img_p.info.get("transparency")
+        if isinstance(transparency, bytes):
+            alpha = transparency[:colors]
+        elif isinstance(transparency, int):
+            transparency = max(0, min(255, transparency))
+            alpha = (b"\xff" * transparency + b"\0")[:colors]
+        elif transparency is None and img_p.im.getpalettemode() == "RGBA":
+            alpha = img_p.im.getpalette("RGBA", "A")[:colors]
+        alpha = list(alpha) + [255] * (colors - len(alpha))
+
+        return [(rgb[i * 3], rgb[i * 3 + 1], rgb[i * 3 + 2], alpha[i])
+                for i in range(colors)]
+
 
 class CompressMethod(Enum):
     NONE = 0x00
     RLE = 0x01
     LZ4 = 0x02
+    AUTO = 0xFF  # try the encoders and keep the best one, never written out
 
 
 class ColorFormat(Enum):
@@ -219,121 +489,253 @@ def bit_extend(value, bpp):
     return res
 
 
+def pack_bits(values, bpp: int, nibble_swap=False) -> bytes:
+    """
+    Pack HxW array of 1/2/4/8 bpp values to lvgl rows, MSB first. Every row
+    starts on a byte boundary, the last byte of a row is padded with 0.
+    nibble_swap swaps the high and low nibble of each byte (I8 for nema_gfx).
+    """
+    values = np.asarray(values, dtype=np.uint8)
+    h, w = values.shape
+    if bpp == 8:
+        out = values
+    else:
+        ppb = 8 // bpp  # pixels per byte
+        padded = np.zeros((h, -(-w // ppb) * ppb), dtype=np.uint8)
+        padded[:, :w] = values
+        groups = padded.reshape(h, -1, ppb)
+        out = np.zeros(groups.shape[:2], dtype=np.uint8)
+        for i in range(ppb):
+            out |= groups[..., i] << (8 - bpp * (i + 1))
+    if nibble_swap:
+        out = (out >> 4) | (out << 4)
+    return out.tobytes()
+
+
+def unpack_bits(data: bytes, bpp: int, w: int, stride: int = 0):
+    """
+    Inverse of pack_bits: unpack lvgl rows of 1/2/4/8 bpp values to HxW array.
+    stride defaults to the byte aligned row length
+    """
+    stride = stride or (w * bpp + 7) // 8
+    data = np.frombuffer(data, dtype=np.uint8)
+    rows = data[:len(data) // stride * stride].reshape(-1, stride)
+    if bpp == 8:
+        return rows[:, :w]
+    shifts = np.arange(8 - bpp, -1, -bpp, dtype=np.uint8)
+    values = (rows[..., None] >> shifts) & ((1 << bpp) - 1)
+    return values.reshape(len(rows), -1)[:, :w]
+
+
+BIT_EXTEND_5 = np.array([bit_extend(v, 5) for v in range(32)], dtype=np.uint8)
+BIT_EXTEND_6 = np.array([bit_extend(v, 6) for v in range(64)], dtype=np.uint8)
+
+
+def unpack_565(px):
+    """
+    RGB565 uint16 array to bit extended R, G, B uint8 arrays
+    """
+    return (BIT_EXTEND_5[(px >> 11) & 0x1f], BIT_EXTEND_6[(px >> 5) & 0x3f],
+            BIT_EXTEND_5[px & 0x1f])
+
+
 def unpack_colors(data: bytes, cf: ColorFormat, w) -> List:
     """
     Unpack lvgl 1/2/4/8/16/32 bpp color to png color: alpha map, grey scale,
     or R,G,B,(A) map
     """
-    ret = []
     bpp = cf.bpp
     if bpp == 8:
-        ret = data
-    elif bpp == 4:
-        if cf == ColorFormat.A4:
-            values = [x * 17 for x in range(16)]
-        else:
-            values = [x for x in range(16)]
-
-        for p in data:
-            for i in range(2):
-                ret.append(values[(p >> (4 - i * 4)) & 0x0f])
-                if len(ret) % w == 0:
-                    break
-
-    elif bpp == 2:
-        if cf == ColorFormat.A2:
-            values = [x * 85 for x in range(4)]
-        else:  # must be ColorFormat.I2
-            values = [x for x in range(4)]
-        for p in data:
-            for i in range(4):
-                ret.append(values[(p >> (6 - i * 2)) & 0x03])
-                if len(ret) % w == 0:
-                    break
-    elif bpp == 1:
-        if cf == ColorFormat.A1:
-            values = [0, 255]
-        else:
-            values = [0, 1]
-        for p in data:
-            for i in range(8):
-                ret.append(values[(p >> (7 - i)) & 0x01])
-                if len(ret) % w == 0:
-                    break
+        return data
+
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if bpp in (1, 2, 4):
+        values = unpack_bits(data, bpp, w)
+        if cf in (ColorFormat.A1, ColorFormat.A2, ColorFormat.A4):
+            values = values * (255 // ((1 << bpp) - 1))  # 1->255, 2->85, 4->17
+        channels = (values.astype(np.uint8), )
     elif bpp == 16:
-        if cf == ColorFormat.RGB565:
-            #  This is RGB565
-            pixels = [(data[2 * i + 1] << 8) | data[2 * i]
-                    for i in range(len(data) // 2)]
-            for p in pixels:
-                ret.append(bit_extend((p >> 11) & 0x1f, 5))  # R
-                ret.append(bit_extend((p >> 5) & 0x3f, 6))  # G
-                ret.append(bit_extend((p >> 0) & 0x1f, 5))  # B
-        elif cf == ColorFormat.RGB565_SWAPPED:
-            #  This is RGB565_SWAPPED
-            pixels = [(data[2 * i] << 8) | data[2 * i + 1]
-                    for i in range(len(data) // 2)]
-            for p in pixels:
-                ret.append(bit_extend((p >> 11) & 0x1f, 5))  # R
-                ret.append(bit_extend((p >> 5) & 0x3f, 6))  # G
-                ret.append(bit_extend((p >> 0) & 0x1f, 5))  # B
+        if cf in (ColorFormat.RGB565, ColorFormat.RGB565_SWAPPED):
+            n = len(raw) // 2
+            lo, hi = raw[0:2 * n:2].astype(np.uint16), raw[1:2 * n:2].astype(np.uint16)
+            if cf == ColorFormat.RGB565_SWAPPED:
+                lo, hi = hi, lo
+            channels = unpack_565(lo | (hi << 8))
         elif cf == ColorFormat.AL88:
             # AL88: low 8bit = Luminance, high 8bit = Alpha
-            L = data[0::2]  # low byte: luminance
-            A = data[1::2]  # high byte: alpha
-            for luma, alpha in zip(L, A):
-                ret.append(luma)  # L
-                ret.append(alpha)  # A
-
+            n = len(raw) // 2
+            channels = (raw[0:2 * n:2], raw[1:2 * n:2])
+        else:
+            return []
     elif bpp == 24:
         if cf == ColorFormat.RGB888:
-            B = data[0::3]
-            G = data[1::3]
-            R = data[2::3]
-            for r, g, b in zip(R, G, B):
-                ret += [r, g, b]
+            n = len(raw) // 3
+            channels = (raw[2:3 * n:3], raw[1:3 * n:3], raw[0:3 * n:3])
         elif cf == ColorFormat.RGB565A8:
-            alpha_size = len(data) // 3
-            pixel_alpha = data[-alpha_size:]
-            pixel_data = data[:-alpha_size]
-            pixels = [(pixel_data[2 * i + 1] << 8) | pixel_data[2 * i]
-                      for i in range(len(pixel_data) // 2)]
-
-            for a, p in zip(pixel_alpha, pixels):
-                ret.append(bit_extend((p >> 11) & 0x1f, 5))  # R
-                ret.append(bit_extend((p >> 5) & 0x3f, 6))  # G
-                ret.append(bit_extend((p >> 0) & 0x1f, 5))  # B
-                ret.append(a)
+            alpha_size = len(raw) // 3
+            pixel_alpha = raw[len(raw) - alpha_size:]
+            pixel_data = raw[:len(raw) - alpha_size]
+            n = min(alpha_size, len(pixel_data) // 2)
+            px = pixel_data[0:2 * n:2].astype(np.uint16) | \
+                (pixel_data[1:2 * n:2].astype(np.uint16) << 8)
+            channels = unpack_565(px) + (pixel_alpha[:n], )
         elif cf == ColorFormat.ARGB8565:
-            L = data[0::3]
-            H = data[1::3]
-            A = data[2::3]
-
-            for h, l, a in zip(H, L, A):
-                p = (h << 8) | (l)
-                ret.append(bit_extend((p >> 11) & 0x1f, 5))  # R
-                ret.append(bit_extend((p >> 5) & 0x3f, 6))  # G
-                ret.append(bit_extend((p >> 0) & 0x1f, 5))  # B
-                ret.append(a)  # A
-
+            n = len(raw) // 3
+            px = raw[0:3 * n:3].astype(np.uint16) | \
+                (raw[1:3 * n:3].astype(np.uint16) << 8)
+            channels = unpack_565(px) + (raw[2:3 * n:3], )
+        else:
+            return []
     elif bpp == 32:
-        B = data[0::4]
-        G = data[1::4]
-        R = data[2::4]
-        A = data[3::4]
+        n = len(raw) // 4
+        b, g, r, a = (raw[i:4 * n:4] for i in range(4))
         if cf == ColorFormat.ARGB8888_PREMULTIPLIED:
-            for r, g, b, a in zip(R, G, B, A):
-                r = (r * a // 255)
-                g = (g * a // 255)
-                b = (b * a // 255)
-                ret += [r, g, b, a]
-        else:
-            for r, g, b, a in zip(R, G, B, A):
-                ret += [r, g, b, a]
+            a16 = a.astype(np.uint16)
+            r, g, b = (c * a16 // 255 for c in (r, g, b))
+        channels = (r, g, b, a)
     else:
         assert 0
 
-    return ret
+    return np.stack(channels, axis=-1).ravel().tolist()
+
+
+# lv_color16_to_32() of the LVGL runtime, the 565 expansion done on device
+LV_EXPAND_5 = (np.arange(32, dtype=np.uint16) * 2106 >> 8).astype(np.uint8)
+LV_EXPAND_6 = (np.arange(64, dtype=np.uint16) * 1037 >> 8).astype(np.uint8)
+
+
+def expand_565(px):
+    """
+    RGB565 uint16 array to R, G, B uint8 arrays the way LVGL renders them
+    """
+    return (LV_EXPAND_5[(px >> 11) & 0x1f], LV_EXPAND_6[(px >> 5) & 0x3f],
+            LV_EXPAND_5[px & 0x1f])
+
+
+def decode_rgba(cf: ColorFormat, w: int, h: int, stride: int, data: bytes,
+                premultiplied=False):
+    """
+    Decode uncompressed lvgl image data (palette, rows with stride and the
+    RGB565A8 alpha map) to HxWx4 uint8 RGBA array, as the device renders it
+    """
+    raw = np.frombuffer(data, dtype=np.uint8)
+    out = np.zeros((h, w, 4), dtype=np.uint8)
+    out[..., 3] = 0xff
+
+    def rows(width, offset=0, row_stride=stride):
+        return raw[offset:offset + h * row_stride].reshape(h, row_stride)[:, :width]
+
+    def u16(lo, hi):
+        return lo.astype(np.uint16) | (hi.astype(np.uint16) << 8)
+
+    if cf.is_indexed:
+        palette_size = cf.ncolors * 4
+        palette = raw[:palette_size].reshape(-1, 4)[:, [2, 1, 0, 3]]
+        out[:] = palette[unpack_bits(raw[palette_size:palette_size + h * stride],
+                                     cf.bpp, w, stride)]
+    elif cf.is_alpha_only:
+        values = unpack_bits(raw[:h * stride], cf.bpp, w, stride)
+        out[..., :3] = 0
+        out[..., 3] = values * (255 // ((1 << cf.bpp) - 1))
+    elif cf == ColorFormat.L8:
+        out[..., :3] = rows(w)[..., None]
+    elif cf == ColorFormat.AL88:
+        pixels = rows(w * 2).reshape(h, w, 2)
+        out[..., :3] = pixels[..., :1]
+        out[..., 3] = pixels[..., 1]
+    elif cf in (ColorFormat.RGB565, ColorFormat.RGB565_SWAPPED,
+                ColorFormat.RGB565A8):
+        pixels = rows(w * 2)
+        lo, hi = pixels[:, 0::2], pixels[:, 1::2]
+        if cf == ColorFormat.RGB565_SWAPPED:
+            lo, hi = hi, lo
+        out[..., 0], out[..., 1], out[..., 2] = expand_565(u16(lo, hi))
+        if cf == ColorFormat.RGB565A8:
+            out[..., 3] = rows(w, h * stride, stride // 2)
+    elif cf == ColorFormat.ARGB8565:
+        pixels = rows(w * 3).reshape(h, w, 3)
+        out[..., 0], out[..., 1], out[..., 2] = expand_565(
+            u16(pixels[..., 0], pixels[..., 1]))
+        out[..., 3] = pixels[..., 2]
+    elif cf == ColorFormat.RGB888:
+        out[..., :3] = rows(w * 3).reshape(h, w, 3)[..., ::-1]
+    elif cf in (ColorFormat.ARGB8888, ColorFormat.XRGB8888,
+                ColorFormat.ARGB8888_PREMULTIPLIED):
+        pixels = rows(w * 4).reshape(h, w, 4)
+        out[..., :3] = pixels[..., 2::-1]
+        if cf != ColorFormat.XRGB8888:
+            out[..., 3] = pixels[..., 3]
+        premultiplied |= cf == ColorFormat.ARGB8888_PREMULTIPLIED
+    else:
+        raise ParameterError(f"Not supported yet: {cf.name}")
+
+    if premultiplied:
+        # back to straight alpha, rounded
+        a = out[..., 3:].astype(np.uint32)
+        rgb = (out[..., :3] * np.uint32(255) + a // 2) // np.maximum(a, 1)
+        out[..., :3] = np.minimum(rgb, 255)
+    return out
+
+
+def png_chunk(tag: bytes, body: bytes) -> bytes:
+    return (struct.pack('>I', len(body)) + tag + body +
+            struct.pack('>I', zlib.crc32(tag + body)))
+
+
+def encode_png_rgba(pixels, level: int = 6) -> bytes:
+    """
+    Write HxWx4 uint8 RGBA array as 8bit RGBA png. Every row uses the "Up"
+    filter, computed for the whole image at once.
+    """
+    h, w = pixels.shape[:2]
+    pixels = pixels.reshape(h, w * 4)
+    scanlines = np.empty((h, w * 4 + 1), dtype=np.uint8)
+    scanlines[:, 0] = 2  # filter type Up
+    scanlines[:, 1:] = pixels
+    scanlines[1:, 1:] -= pixels[:-1]
+    ihdr = struct.pack('>IIBBBBB', w, h, 8, 6, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + png_chunk(b'IHDR', ihdr) +
+            png_chunk(b'IDAT', zlib.compress(scanlines.tobytes(), level)) +
+            png_chunk(b'IEND', b''))
+
+
+# "0x00," ... "0xff," as 256x5 ascii table, indexed by byte value
+C_ARRAY_HEX = np.frombuffer("".join(f"0x{v:02x}," for v in range(256)).encode(),
+                            dtype=np.uint8).reshape(256, 5)
+C_ARRAY_NEWLINE = np.frombuffer(b"\n    ", dtype=np.uint8)
+C_ARRAY_CHUNK = 1 << 16  # characters formatted per write
+
+
+def write_c_array_binary(f, data: bytes, stride: int):
+    """
+    Write data as C array items, one line per stride bytes.
+    Whole lines are formatted at once from the hex table and written to f
+    in large chunks.
+    """
+    stride = 16 if stride == 0 else stride
+    data = np.frombuffer(data, dtype=np.uint8)
+    nlines = len(data) // stride
+    line_len = len(C_ARRAY_NEWLINE) + stride * 5
+    lines_per_chunk = max(1, C_ARRAY_CHUNK // line_len)
+
+    for start in range(0, nlines, lines_per_chunk):
+        end = min(start + lines_per_chunk, nlines)
+        lines = data[start * stride:end * stride].reshape(-1, stride)
+        text = np.empty((len(lines), line_len), dtype=np.uint8)
+        text[:, :len(C_ARRAY_NEWLINE)] = C_ARRAY_NEWLINE
+        text[:, len(C_ARRAY_NEWLINE):] = C_ARRAY_HEX[lines].reshape(len(lines), -1)
+        f.write(text.tobytes().decode("ascii"))
+
+    tail = data[nlines * stride:]
+    if len(tail):
+        f.write("\n    " + C_ARRAY_HEX[tail].tobytes().decode("ascii"))
+    f.write("\n")
+
+
+def c_array_varname(filename: str, outputname: str = None) -> str:
+    if outputname is not None:
+        return outputname
+    return path.basename(filename).split('.')[0].replace("-", "_").replace(".", "_")
 
 
 def write_c_array_file(
@@ -344,8 +746,34 @@ def write_c_array_file(
         outputname: str,
         premultiplied: bool,
         compress: CompressMethod,
-        data: bytes):
-    varname = path.basename(filename).split('.')[0].replace("-", "_").replace(".", "_") if outputname is None else outputname
+        data: bytes,
+        comment: str = None,
+        lv_version: str = "v9"):
+    with open(filename, "w+", buffering=C_ARRAY_CHUNK) as f:
+        write_c_array(f, w, h, stride, cf,
+                      c_array_varname(filename, outputname), premultiplied,
+                      compress, data, comment, lv_version)
+
+
+def write_c_array(
+        f,
+        w: int, h: int,
+        stride: int,
+        cf: ColorFormat,
+        varname: str,
+        premultiplied: bool,
+        compress: CompressMethod,
+        data: bytes,
+        comment: str = None,
+        lv_version: str = "v9"):
+    """
+    Write C array source to text stream f, which can be a file or io.StringIO.
+    comment, if given, is written as a C comment on top of the file.
+    lv_version "v8" writes a lv_img_dsc_t for LVGL v8 instead
+    """
+    if lv_version == "v8":
+        return write_c_array_v8(f, w, h, stride, cf, varname, premultiplied,
+                                compress, data, comment)
 
     flags = "0"
     if compress is not CompressMethod.NONE:
@@ -398,28 +826,118 @@ const lv_image_dsc_t {varname} = {{
 
 '''
 
-    def write_binary(f, data, stride):
-        stride = 16 if stride == 0 else stride
-        for i, v in enumerate(data):
-            if i % stride == 0:
-                f.write("\n    ")
-            f.write(f"0x{v:02x},")
-        f.write("\n")
+    if comment:
+        f.write(f"\n/* {comment} */\n")
+    f.write(header)
 
-    with open(filename, "w+") as f:
-        f.write(header)
+    if compress != CompressMethod.NONE:
+        write_c_array_binary(f, data, 16)
+    else:
+        # write palette separately
+        ncolors = cf.ncolors
+        if ncolors:
+            write_c_array_binary(f, data[:ncolors * 4], 16)
+
+        write_c_array_binary(f, data[ncolors * 4:], stride)
+
+    f.write(ending)
+
+
+# LVGL v8 color format of each v9 format with the same data layout, and the
+# lv_conf.h condition the data requires (v8 true color follows LV_COLOR_DEPTH)
+LV8_COLOR_FORMATS = {
+    ColorFormat.RAW: ("LV_IMG_CF_RAW", None),
+    ColorFormat.RAW_ALPHA: ("LV_IMG_CF_RAW_ALPHA", None),
+    ColorFormat.I1: ("LV_IMG_CF_INDEXED_1BIT", None),
+    ColorFormat.I2: ("LV_IMG_CF_INDEXED_2BIT", None),
+    ColorFormat.I4: ("LV_IMG_CF_INDEXED_4BIT", None),
+    ColorFormat.I8: ("LV_IMG_CF_INDEXED_8BIT", None),
+    ColorFormat.A1: ("LV_IMG_CF_ALPHA_1BIT", None),
+    ColorFormat.A2: ("LV_IMG_CF_ALPHA_2BIT", None),
+    ColorFormat.A4: ("LV_IMG_CF_ALPHA_4BIT", None),
+    ColorFormat.A8: ("LV_IMG_CF_ALPHA_8BIT", None),
+    ColorFormat.RGB565: ("LV_IMG_CF_TRUE_COLOR",
+                         "LV_COLOR_DEPTH == 16 && LV_COLOR_16_SWAP == 0"),
+    ColorFormat.RGB565_SWAPPED: ("LV_IMG_CF_TRUE_COLOR",
+                                 "LV_COLOR_DEPTH == 16 && LV_COLOR_16_SWAP != 0"),
+    ColorFormat.ARGB8565: ("LV_IMG_CF_TRUE_COLOR_ALPHA",
+                           "LV_COLOR_DEPTH == 16 && LV_COLOR_16_SWAP == 0"),
+    ColorFormat.RGB565A8: ("LV_IMG_CF_RGB565A8",
+                           "LV_COLOR_DEPTH == 16 && LV_COLOR_16_SWAP == 0"),
+    ColorFormat.XRGB8888: ("LV_IMG_CF_TRUE_COLOR", "LV_COLOR_DEPTH == 32"),
+    ColorFormat.ARGB8888: ("LV_IMG_CF_TRUE_COLOR_ALPHA", "LV_COLOR_DEPTH == 32"),
+}
+
+
+def write_c_array_v8(
+        f,
+        w: int, h: int,
+        stride: int,
+        cf: ColorFormat,
+        varname: str,
+        premultiplied: bool,
+        compress: CompressMethod,
+        data: bytes,
+        comment: str = None):
+    """
+    Write LVGL v8 C array source. v8 has no compression, stride or
+    premultiplied flag, rows must be packed as with stride align 1.
+    """
+    if cf not in LV8_COLOR_FORMATS:
+        raise ParameterError(f"{cf.name} is not supported by LVGL v8")
+    if premultiplied:
+        raise ParameterError("LVGL v8 does not support premultiplied images")
+    if compress != CompressMethod.NONE:
+        raise ParameterError("LVGL v8 does not support compressed images")
+    if stride and stride != LVGLImageHeader(cf, w, h).stride:
+        raise ParameterError(f"LVGL v8 does not support stride: {stride}")
+
+    v8_cf, condition = LV8_COLOR_FORMATS[cf]
+    macro = "LV_ATTRIBUTE_IMG_" + varname.upper()
+    if comment:
+        f.write(f"\n/* {comment} */\n")
+    f.write(f'''
+#if defined(LV_LVGL_H_INCLUDE_SIMPLE)
+#include "lvgl.h"
+#else
+#include "lvgl/lvgl.h"
+#endif
+''')
+    if condition:
+        f.write(f'''
+#if !({condition})
+#error "{varname}: {cf.name} data needs {condition}"
+#endif
+''')
+    f.write(f'''
+#ifndef LV_ATTRIBUTE_MEM_ALIGN
+#define LV_ATTRIBUTE_MEM_ALIGN
+#endif
 
-        if compress != CompressMethod.NONE:
-            write_binary(f, data, 16)
-        else:
-            # write palette separately
-            ncolors = cf.ncolors
-            if ncolors:
-                write_binary(f, data[:ncolors * 4], 16)
+#ifndef {macro}
+#define {macro}
+#endif
 
-            write_binary(f, data[ncolors * 4:], stride)
+const LV_ATTRIBUTE_MEM_ALIGN LV_ATTRIBUTE_LARGE_CONST {macro} uint8_t {varname}_map[] = {{
+''')
+    ncolors = cf.ncolors
+    if ncolors:
+        write_c_array_binary(f, data[:ncolors * 4], 16)
+    write_c_array_binary(f, data[ncolors * 4:], stride)
+    f.write(f'''
+}};
 
-        f.write(ending)
+const lv_img_dsc_t {varname} = {{
+  .header.cf = {v8_cf},
+  .header.always_zero = 0,
+  .header.reserved = 0,
+  .header.w = {w},
+  .header.h = {h},
+  .data_size = sizeof({varname}_map),
+  .data = {varname}_map,
+}};
+
+''')
 
 
 class LVGLImageHeader:
@@ -482,6 +1000,7 @@ class LVGLImageHeader:
             self.cf = ColorFormat(data[1] & 0x1f)  # color format
         except ValueError as exc:
             raise FormatError(f"invalid color format: {hex(data[0])}") from exc
+        self.flags = int.from_bytes(data[2:4], 'little')
         self.w = int.from_bytes(data[4:6], 'little')
         self.h = int.from_bytes(data[6:8], 'little')
         self.stride = int.from_bytes(data[8:10], 'little')
@@ -489,16 +1008,102 @@ class LVGLImageHeader:
 
 
 class LVGLCompressData:
+    # CompressMethod.AUTO candidates, fastest to decode first
+    AUTO_DECODE_ORDER = (CompressMethod.NONE, CompressMethod.LZ4,
+                         CompressMethod.RLE)
+    _auto_pool = None
 
     def __init__(self,
                  cf: ColorFormat,
                  method: CompressMethod,
-                 raw_data: bytes = b''):
+                 raw_data: bytes = b'',
+                 policy: str = "smallest",
+                 budget: float = 1.0,
+                 early_ratio: float = 0.25):
+        """
+        For CompressMethod.AUTO, policy "smallest" keeps the smallest output and
+        stops at the first encoder, in decode order, that reaches early_ratio;
+        policy "fastest" keeps the fastest to decode whose ratio fits budget.
+        The chosen method is in self.compress, the ratios in self.report
+        """
         self.blk_size = (cf.bpp + 7) // 8
         self.compress = method
         self.raw_data = raw_data
         self.raw_data_len = len(raw_data)
-        self.compressed = self._compress(raw_data)
+        self.report = None
+        if method == CompressMethod.AUTO:
+            chosen = self._auto(cf, raw_data, policy, budget, early_ratio)
+            self.compress = chosen.compress
+            self.compressed = chosen.compressed
+            self.compressed_len = getattr(chosen, "compressed_len", self.raw_data_len)
+        else:
+            self.compressed = self._compress(raw_data)
+
+    def _auto(self, cf, raw_data, policy, budget, early_ratio):
+        if policy not in ("smallest", "fastest"):
+            raise ParameterError(f"Invalid auto compress policy: {policy}")
+
+        if LVGLCompressData._auto_pool is None:
+            LVGLCompressData._auto_pool = ThreadPoolExecutor(max_workers=2)
+        raw_len = max(1, self.raw_data_len)
+        done = {CompressMethod.NONE: LVGLCompressData(cf, CompressMethod.NONE, raw_data)}
+        ratios = {CompressMethod.NONE: 1.0}
+
+        if policy == "fastest" and budget >= 1.0:
+            futures = {}  # no compression needed
+        else:
+            # lz4 releases the GIL, RLE runs on numpy arrays: encode in parallel
+            futures = {LVGLCompressData._auto_pool.submit(
+                LVGLCompressData, cf, m, raw_data): m
+                for m in self.AUTO_DECODE_ORDER[1:]}
+
+        def take(fut):
+            m = futures[fut]
+            done[m] = fut.result()
+            ratios[m] = len(done[m].compressed) / raw_len
+
+        if policy == "smallest":
+            # results are taken in decode order rather than completion order,
+            # the early stop then only depends on the data
+            for fut in futures:
+                take(fut)
+                if ratios[futures[fut]] <= early_ratio:
+                    break  # clearly good enough
+            chosen = min(done, key=lambda m: (ratios[m], self.AUTO_DECODE_ORDER.index(m)))
+        else:
+            chosen = None
+            for m in self.AUTO_DECODE_ORDER:
+                if m not in ratios:
+                    take(next(f for f, fm in futures.items() if fm == m))
+                if ratios[m] <= budget:
+                    chosen = m
+                    break
+            if chosen is None:
+                chosen = min(done, key=lambda m: (ratios[m], self.AUTO_DECODE_ORDER.index(m)))
+
+        for fut in futures:
+            fut.cancel()
+        self.report = {
+            "method": chosen.name,
+            "policy": policy,
+            "ratios": {m.name: round(ratios[m], 4) for m in self.AUTO_DECODE_ORDER
+                       if m in ratios},
+        }
+        return done[chosen]
+
+    @property
+    def report_text(self) -> str:
+        """
+        One line summary of the AUTO choice, None for a fixed method
+        """
+        if not self.report:
+            return None
+        ratios = ", ".join(
+            f"{m.name} {self.report['ratios'][m.name] * 100:.1f}%"
+            if m.name in self.report["ratios"] else f"{m.name} skipped"
+            for m in self.AUTO_DECODE_ORDER)
+        return (f"LVGL compress: AUTO ({self.report['policy']}) -> "
+                f"{self.report['method']}; {ratios}")
 
     def _compress(self, raw_data: bytes) -> bytearray:
         if self.compress == CompressMethod.NONE:
@@ -524,6 +1129,42 @@ class LVGLCompressData:
         bin += compressed
         return bin
 
+    @staticmethod
+    def decompress(cf: ColorFormat, data: bytes, expect_len: int = None) -> bytes:
+        """
+        Decompress data starting with the 12 bytes compress header.
+        expect_len is the data length from the image header, a compress
+        header claiming another length is rejected before decompressing
+        """
+        if len(data) < 12:
+            raise FormatError("invalid compress header length")
+
+        method = int.from_bytes(data[0:4], 'little')
+        compressed_len = int.from_bytes(data[4:8], 'little')
+        raw_data_len = int.from_bytes(data[8:12], 'little')
+        compressed = data[12:12 + compressed_len]
+        if expect_len is not None and raw_data_len != expect_len:
+            raise FormatError(f"decompressed length error got: "
+                              f"{raw_data_len}, expect: {expect_len}")
+
+        if method == CompressMethod.RLE.value:
+            blk_size = (cf.bpp + 7) // 8
+            raw_data = rle_decode(compressed, blk_size,
+                                  raw_data_len)[:raw_data_len]
+        elif method == CompressMethod.LZ4.value:
+            try:
+                raw_data = lz4.block.decompress(bytes(compressed),
+                                                uncompressed_size=raw_data_len)
+            except lz4.block.LZ4BlockError as exc:
+                raise FormatError(f"invalid lz4 data: {exc}") from exc
+        else:
+            raise FormatError(f"invalid compress method: {method}")
+
+        if len(raw_data) != raw_data_len:
+            raise FormatError(f"decompressed length error got: "
+                              f"{len(raw_data)}, expect: {raw_data_len}")
+        return raw_data
+
 
 class LVGLImage:
 
@@ -536,6 +1177,8 @@ class LVGLImage:
         self.premultiplied = False
         self.rgb565_dither = False
         self.nema_gfx = False
+        self.compress_options = {}  # policy/budget/early_ratio for AUTO
+        self.compress_report = None  # AUTO choice and ratios of last output
         self.set_data(cf, w, h, data)
 
     def __repr__(self) -> str:
@@ -577,39 +1220,34 @@ class LVGLImage:
             raise ParameterError(f"Stride is too small:{stride}, "
                                  f"minimal:{current.stride_default}")
 
-        def change_stride(data: bytearray, h, current_stride, new_stride):
-            data_in = data
-            data_out = []  # stride adjusted new data
-            if new_stride < current_stride:  # remove padding byte
-                for i in range(h):
-                    start = i * current_stride
-                    end = start + new_stride
-                    data_out.append(data_in[start:end])
-            else:  # adding more padding bytes
-                padding = b'\x00' * (new_stride - current_stride)
-                for i in range(h):
-                    data_out.append(data_in[i * current_stride:(i + 1) *
-                                            current_stride])
-                    data_out.append(padding)
-            return b''.join(data_out)
-
         palette_size = self.cf.ncolors * 4
-        data_out = [self.data[:palette_size]]
-        data_out.append(
-            change_stride(self.data[palette_size:], self.h, current.stride,
-                          stride))
+        new_len = palette_size + stride * self.h
+        if self.cf == ColorFormat.RGB565A8:
+            new_len += stride // 2 * self.h
+        data_out = bytearray(new_len)
+        data_out[:palette_size] = self.data[:palette_size]
+
+        def copy_rows(offset_in, stride_in, offset_out, stride_out):
+            # copy h rows between strided views, new padding bytes stay zero
+            n = min(stride_in, stride_out)
+            src = np.frombuffer(self.data, dtype=np.uint8,
+                                count=self.h * stride_in, offset=offset_in)
+            dst = np.frombuffer(data_out, dtype=np.uint8,
+                                count=self.h * stride_out, offset=offset_out)
+            dst.reshape(self.h, stride_out)[:, :n] = \
+                src.reshape(self.h, stride_in)[:, :n]
+
+        copy_rows(palette_size, current.stride, palette_size, stride)
 
         # deal with alpha map for RGB565A8
         if self.cf == ColorFormat.RGB565A8:
             logging.warning("handle RGB565A8 alpha map")
             a8_stride = self.stride // 2
-            a8_map = self.data[-a8_stride * self.h:]
-            data_out.append(
-                change_stride(a8_map, self.h, current.stride // 2,
-                              stride // 2))
+            copy_rows(len(self.data) - a8_stride * self.h, a8_stride,
+                      stride * self.h, stride // 2)
 
         self.stride = stride
-        self.data = bytearray(b''.join(data_out))
+        self.data = data_out
 
     def premultiply(self):
         """
@@ -621,84 +1259,47 @@ class LVGLImage:
         if not self.cf.has_alpha:
             raise ParameterError(f"Image has no alpha channel: {self.cf.name}")
 
-        if self.cf.is_indexed:
+        if not isinstance(self.data, bytearray):
+            self.data = bytearray(self.data)
 
-            def multiply(b, g, r, a):
-                # The precision is reduced, the correct way would be to divide by 255,
-                # but this is consistent with the premultiply function in the code.
-                r, g, b = (r * a) >> 8, (g * a) >> 8, (b * a) >> 8
-                return uint8_t(b) + uint8_t(g) + uint8_t(r) + uint8_t(a)
+        def rows(width, offset=0, stride=None):
+            # writable HxW view over self.data, skipping the stride padding
+            stride = stride or self.stride
+            buf = np.frombuffer(self.data, dtype=np.uint8,
+                                count=self.h * stride, offset=offset)
+            return buf.reshape(self.h, stride)[:, :width]
 
+        def split565(px):
+            return (px >> 11) & 0x1f, (px >> 5) & 0x3f, px & 0x1f
+
+        if self.cf.is_indexed:
             # process the palette only.
-            palette_size = self.cf.ncolors * 4
-            palette = self.data[:palette_size]
-            palette = [
-                multiply(palette[i], palette[i + 1], palette[i + 2],
-                         palette[i + 3]) for i in range(0, len(palette), 4)
-            ]
-            palette = b''.join(palette)
-            self.data = palette + self.data[palette_size:]
+            # The precision is reduced, the correct way would be to divide by 255,
+            # but this is consistent with the premultiply function in the code.
+            palette = np.frombuffer(self.data, dtype=np.uint8,
+                                    count=self.cf.ncolors * 4).reshape(-1, 4)
+            a = palette[:, 3:].astype(np.uint16)
+            palette[:, :3] = (palette[:, :3].astype(np.uint16) * a) >> 8
         elif self.cf is ColorFormat.ARGB8888:
-
-            def multiply(b, g, r, a):
-                r, g, b = (r * a) >> 8, (g * a) >> 8, (b * a) >> 8
-                return uint32_t((a << 24) | (r << 16) | (g << 8) | (b << 0))
-
-            line_width = self.w * 4
-            for h in range(self.h):
-                offset = h * self.stride
-                map = self.data[offset:offset + self.stride]
-
-                processed = b''.join([
-                    multiply(map[i], map[i + 1], map[i + 2], map[i + 3])
-                    for i in range(0, line_width, 4)
-                ])
-                self.data[offset:offset + line_width] = processed
+            bgra = rows(self.w * 4).reshape(self.h, self.w, 4)
+            a = bgra[..., 3:].astype(np.uint16)
+            bgra[..., :3] = (bgra[..., :3].astype(np.uint16) * a) >> 8
         elif self.cf is ColorFormat.RGB565A8:
-
-            def multiply(data, a):
-                r = (data >> 11) & 0x1f
-                g = (data >> 5) & 0x3f
-                b = (data >> 0) & 0x1f
-
-                r, g, b = (r * a) // 255, (g * a) // 255, (b * a) // 255
-                return uint16_t((r << 11) | (g << 5) | (b << 0))
-
-            line_width = self.w * 2
-            for h in range(self.h):
-                # alpha map offset for this line
-                offset = self.h * self.stride + h * (self.stride // 2)
-                a = self.data[offset:offset + self.stride // 2]
-
-                # RGB map offset
-                offset = h * self.stride
-                rgb = self.data[offset:offset + self.stride]
-
-                processed = b''.join([
-                    multiply((rgb[i + 1] << 8) | rgb[i], a[i // 2])
-                    for i in range(0, line_width, 2)
-                ])
-                self.data[offset:offset + line_width] = processed
+            rgb = rows(self.w * 2)
+            a = rows(self.w, self.h * self.stride, self.stride // 2).astype(np.uint16)
+            r, g, b = split565(rgb[:, 0::2].astype(np.uint16) |
+                               (rgb[:, 1::2].astype(np.uint16) << 8))
+            px = ((r * a // 255) << 11) | ((g * a // 255) << 5) | (b * a // 255)
+            rgb[:, 0::2] = px & 0xff
+            rgb[:, 1::2] = px >> 8
         elif self.cf is ColorFormat.ARGB8565:
-
-            def multiply(data, a):
-                r = (data >> 11) & 0x1f
-                g = (data >> 5) & 0x3f
-                b = (data >> 0) & 0x1f
-
-                r, g, b = (r * a) // 255, (g * a) // 255, (b * a) // 255
-                return uint24_t((a << 16) | (r << 11) | (g << 5) | (b << 0))
-
-            line_width = self.w * 3
-            for h in range(self.h):
-                offset = h * self.stride
-                map = self.data[offset:offset + self.stride]
-
-                processed = b''.join([
-                    multiply((map[i + 1] << 8) | map[i], map[i + 2])
-                    for i in range(0, line_width, 3)
-                ])
-                self.data[offset:offset + line_width] = processed
+            pixels = rows(self.w * 3).reshape(self.h, self.w, 3)
+            a = pixels[..., 2].astype(np.uint16)
+            r, g, b = split565(pixels[..., 0].astype(np.uint16) |
+                               (pixels[..., 1].astype(np.uint16) << 8))
+            px = ((r * a // 255) << 11) | ((g * a // 255) << 5) | (b * a // 255)
+            pixels[..., 0] = px & 0xff
+            pixels[..., 1] = px >> 8
         else:
             raise ParameterError(f"Not supported yet: {self.cf.name}")
 
@@ -757,8 +1358,19 @@ class LVGLImage:
 
     def from_data(self, data: bytes):
         header = LVGLImageHeader().from_binary(data)
-        return self.set_data(header.cf, header.w, header.h,
-                             data[len(header.binary):], header.stride)
+        data = data[len(header.binary):]
+        if header.flags & 0x08:  # compressed
+            # the buffer is sized from the image header, not the compress header
+            expect = LVGLImage()
+            expect.cf, expect.w, expect.h = header.cf, header.w, header.h
+            expect.stride = LVGLImageHeader(header.cf, header.w, header.h,
+                                            header.stride).stride
+            data = LVGLCompressData.decompress(header.cf, data,
+                                               expect.data_len)
+        self.set_data(header.cf, header.w, header.h, bytearray(data),
+                      header.stride)
+        self.premultiplied = bool(header.flags & 0x01)
+        return self
 
     def from_bin(self, filename: str):
         """
@@ -792,43 +1404,113 @@ class LVGLImage:
         self._check_dir(filename)
 
         with open(filename, "wb+") as f:
-            bin = bytearray()
-            flags = 0
-            flags |= 0x08 if compress != CompressMethod.NONE else 0
-            flags |= 0x01 if self.premultiplied else 0
-
-            header = LVGLImageHeader(self.cf,
-                                     self.w,
-                                     self.h,
-                                     self.stride,
-                                     flags=flags)
-            bin += header.binary
-            compressed = LVGLCompressData(self.cf, compress, self.data)
-            bin += compressed.compressed
-
-            f.write(bin)
+            f.write(self.to_bin_bytes(compress))
 
         return self
 
+    def to_bin_bytes(self,
+                     compress: CompressMethod = CompressMethod.NONE,
+                     progress=None) -> bytes:
+        """
+        Return this image as '.bin' file content.
+        progress, if given, is called with "compress" and "emit" stage names
+        """
+        if progress and compress != CompressMethod.NONE:
+            progress("compress")
+        compressed = LVGLCompressData(self.cf, compress, self.data,
+                                      **self.compress_options)
+        self.compress_report = compressed.report
+        if progress:
+            progress("emit")
+        bin = bytearray()
+        flags = 0
+        flags |= 0x08 if compressed.compress != CompressMethod.NONE else 0
+        flags |= 0x01 if self.premultiplied else 0
+
+        header = LVGLImageHeader(self.cf,
+                                 self.w,
+                                 self.h,
+                                 self.stride,
+                                 flags=flags)
+        bin += header.binary
+        bin += compressed.compressed
+        return bytes(bin)
+
     def to_c_array(self,
                    filename: str,
                    compress: CompressMethod = CompressMethod.NONE,
-                   outputname: str = None):
+                   outputname: str = None,
+                   lv_version: str = "v9"):
         self._check_ext(filename, ".c")
         self._check_dir(filename)
 
+        compress, data, comment = self._c_array_data(compress,
+                                                     lv_version=lv_version)
+        write_c_array_file(self.w, self.h, self.stride, self.cf, filename, outputname,
+                           self.premultiplied,
+                           compress, data, comment, lv_version)
+
+    def _c_array_data(self, compress: CompressMethod, progress=None,
+                      lv_version: str = "v9"):
+        """
+        Return (resolved compress method, array data, AUTO summary comment).
+        LVGL v8 has no compressed images, so AUTO keeps the data as is
+        """
+        comment = None
+        if lv_version == "v8" and compress == CompressMethod.AUTO:
+            compress = CompressMethod.NONE
         if compress != CompressMethod.NONE:
-            data = LVGLCompressData(self.cf, compress, self.data).compressed
+            if progress:
+                progress("compress")
+            compressed = LVGLCompressData(self.cf, compress, self.data,
+                                          **self.compress_options)
+            compress, comment = compressed.compress, compressed.report_text
+            self.compress_report = compressed.report
+            data = compressed.compressed
         else:
             data = self.data
-        write_c_array_file(self.w, self.h, self.stride, self.cf, filename, outputname,
-                           self.premultiplied,
-                           compress, data)
+        return compress, data, comment
+
+    def to_c_array_bytes(self,
+                         outputname: str,
+                         compress: CompressMethod = CompressMethod.NONE,
+                         progress=None,
+                         lv_version: str = "v9") -> bytes:
+        """
+        Return this image as '.c' file content, outputname is the C variable name.
+        progress, if given, is called with "compress" and "emit" stage names
+        """
+        compress, data, comment = self._c_array_data(compress, progress,
+                                                     lv_version)
+        if progress:
+            progress("emit")
+        f = io.StringIO()
+        write_c_array(f, self.w, self.h, self.stride, self.cf, outputname,
+                      self.premultiplied, compress, data, comment, lv_version)
+        return f.getvalue().encode("utf-8")
 
     def to_png(self, filename: str):
         self._check_ext(filename, ".png")
         self._check_dir(filename)
 
+        png_data = self.to_png_bytes()
+        if png_data is None:
+            return
+
+        with open(filename, "wb") as f:
+            f.write(png_data)
+
+    def to_rgba(self):
+        """
+        Decode this image to HxWx4 uint8 RGBA array
+        """
+        return decode_rgba(self.cf, self.w, self.h, self.stride, self.data,
+                           self.premultiplied)
+
+    def to_png_bytes(self) -> bytes:
+        """
+        Return this image converted back to '.png' file content
+        """
         old_stride = self.stride
         self.adjust_stride(align=1)
         if self.cf.is_indexed:
@@ -850,9 +1532,9 @@ class LVGLImage:
         elif self.cf.is_alpha_only:
             # separate packed data to plain data
             transparency = unpack_colors(self.data, self.cf, self.w)
-            data = []
-            for a in transparency:
-                data += [0, 0, 0, a]
+            data = np.zeros((len(transparency), 4), dtype=np.uint8)
+            data[:, 3] = np.frombuffer(bytes(transparency), dtype=np.uint8)
+            data = data.ravel().tolist()
             encoder = png.Writer(self.w, self.h, greyscale=False, alpha=True)
         elif self.cf == ColorFormat.L8:
             # to grayscale
@@ -878,12 +1560,27 @@ class LVGLImage:
             data = unpack_colors(self.data, self.cf, self.w)
         else:
             logging.warning(f"missing logic: {self.cf.name}")
-            return
+            return None
 
-        with open(filename, "wb") as f:
-            encoder.write_array(f, data)
+        f = io.BytesIO()
+        encoder.write_array(f, data)
 
         self.adjust_stride(stride=old_stride)
+        return f.getvalue()
+
+    def to_preview_png_bytes(self) -> bytes:
+        """
+        Return this image as 8bit RGBA '.png' file content, decoded as the
+        device renders it (565 expanded like lv_color16_to_32(), straight
+        alpha). Used by the web preview, the CLI keeps to_png_bytes
+        """
+        if not (self.cf.is_indexed or self.cf.is_alpha_only
+                or self.cf.is_colormap or self.cf in (ColorFormat.L8,
+                                                      ColorFormat.AL88)):
+            logging.warning(f"missing logic: {self.cf.name}")
+            return None
+
+        return encode_png_rgba(self.to_rgba())
 
     def from_png(self,
                  filename: str,
@@ -911,20 +1608,119 @@ class LVGLImage:
 
         if cf is None or cf.is_indexed:  # palette mode
             self._png_to_indexed(cf, filename)
-        elif cf.is_alpha_only:
-            self._png_to_alpha_only(cf, filename)
+        else:
+            # pypng decodes row by row, pack in bands as rows arrive
+            w, h, rows, info = png.Reader(str(filename)).asRGBA8()
+            if (cf.is_alpha_only or cf == ColorFormat.AL88) and not info['alpha']:
+                raise FormatError(f"{filename} has no alpha channel")
+            self.from_rgba_bands(rgba_row_bands(rows, w), w, h, cf, background,
+                                 rgb565_dither, nema_gfx)
+
+        logging.info(f"from png: {filename}, cf: {self.cf.name}")
+        return self
+
+    def from_rgba(self,
+                  pixels,
+                  cf: ColorFormat = None,
+                  background: int = 0x00_00_00,
+                  rgb565_dither=False,
+                  nema_gfx=False,
+                  w: int = 0,
+                  h: int = 0):
+        """
+        Create lvgl image from HxWx4 uint8 RGBA array, or from raw RGBA
+        buffer together with w and h.
+        If cf is none, used I1/2/4/8 based on palette size
+        """
+        if not isinstance(pixels, np.ndarray):
+            pixels = np.frombuffer(pixels, dtype=np.uint8).reshape(h, w, 4)
+        if pixels.ndim != 3 or pixels.shape[2] != 4 or pixels.dtype != np.uint8:
+            raise ParameterError(f"Invalid RGBA array: {pixels.shape}, "
+                                 f"{pixels.dtype}")
+
+        self.background = background
+        self.rgb565_dither = rgb565_dither
+        self.nema_gfx = nema_gfx
+
+        if cf is None or cf.is_indexed:  # palette mode
+            self._rgba_to_indexed(cf, pixels)
+        else:
+            self._rgba_to_image(cf, pixels)
+
+        logging.info(f"from rgba: {pixels.shape[1]}x{pixels.shape[0]}, "
+                     f"cf: {self.cf.name}")
+        return self
+
+    def from_rgba_bands(self,
+                        bands,
+                        w: int,
+                        h: int,
+                        cf: ColorFormat,
+                        background: int = 0x00_00_00,
+                        rgb565_dither=False,
+                        nema_gfx=False,
+                        align: int = 1):
+        """
+        Create lvgl image of a non-indexed cf from an iterable of HxWx4 uint8
+        RGBA row bands, top to bottom. Each band is packed straight into the
+        stride aligned data, the whole RGBA image is never held in memory.
+        Indexed formats need the whole image to build the palette.
+        """
+        if cf is None or cf.is_indexed:
+            raise ParameterError("Indexed formats cannot be packed by band")
+
+        self.background = background
+        self.rgb565_dither = rgb565_dither
+        self.nema_gfx = nema_gfx
+
+        stride = LVGLImageHeader(cf, w, h, align=align).stride
+        default = LVGLImageHeader(cf, w, h).stride
+        data = bytearray(stride * h + (stride // 2 * h if cf is ColorFormat.RGB565A8 else 0))
+        view = np.frombuffer(data, dtype=np.uint8)
+        rows = view[:stride * h].reshape(h, stride)
+        alpha_rows = view[stride * h:].reshape(h, stride // 2) \
+            if cf is ColorFormat.RGB565A8 else None
+
+        y = 0
+        for band in bands:
+            n = band.shape[0]
+            if band.shape[1:] != (w, 4) or y + n > h:
+                raise ParameterError(f"Invalid RGBA band: {band.shape} at row {y}")
+            packed = np.frombuffer(pack_rgba(band, cf, background,
+                                             rgb565_dither, y), dtype=np.uint8)
+            if alpha_rows is not None:
+                rows[y:y + n, :default] = packed[:n * default].reshape(n, default)
+                alpha_rows[y:y + n, :w] = packed[n * default:].reshape(n, w)
+            else:
+                rows[y:y + n, :default] = packed.reshape(n, default)
+            y += n
+        if y != h:
+            raise ParameterError(f"Got {y} rows of RGBA bands, expect: {h}")
+
+        self.set_data(cf, w, h, data, stride)
+        logging.info(f"from rgba bands: {w}x{h}, cf: {self.cf.name}")
+        return self
+
+    def from_pil(self, img, cf: ColorFormat = None, **kwargs):
+        """
+        Create lvgl image from PIL image, see from_rgba for the options
+        """
+        if img.mode != "RGBA":
+            img = img.convert("RGBA")
+        return self.from_rgba(np.asarray(img), cf, **kwargs)
+
+    def _rgba_to_image(self, cf: ColorFormat, pixels):
+        if cf.is_alpha_only:
+            self._rgba_to_alpha_only(cf, pixels)
         elif cf == ColorFormat.AL88:
-            self._png_to_al88(cf, filename)
+            self._rgba_to_al88(cf, pixels)
         elif cf.is_luma_only:
-            self._png_to_luma_only(cf, filename)
+            self._rgba_to_luma_only(cf, pixels)
         elif cf.is_colormap:
-            self._png_to_colormap(cf, filename)
+            self._rgba_to_colormap(cf, pixels)
         else:
             logging.warning(f"missing logic: {cf.name}")
 
-        logging.info(f"from png: {filename}, cf: {self.cf.name}")
-        return self
-
     def _png_to_indexed(self, cf: ColorFormat, filename: str):
         # convert to palette mode
         auto_cf = cf is None
@@ -936,12 +1732,30 @@ class LVGLImage:
         # to preserve original palette data only convert the image if needed. For this
         # check if image has a palette and the requested palette size equals the existing one
         if not 'palette' in metadata or not auto_cf and len(metadata['palette']) !=  2 ** cf.bpp:
-            # reread and convert file
-            reader = png.Reader(
-                bytes=PngQuant(256 if auto_cf else cf.ncolors).convert(filename))
-            w, h, rows, _ = reader.read()
+            # quantize straight from Pillow, no PNG re-encode/decode
+            from PIL import Image
+            with Image.open(filename) as img:
+                palette, indices = PngQuant(256 if auto_cf else cf.ncolors).quantize_indexed(img)
+            self._palette_to_indexed(cf, list(palette), w, h, indices,
+                                     path.basename(filename))
+            return
 
         palette = reader.palette(alpha="force")  # always return alpha
+        self._palette_to_indexed(cf, palette, w, h, rows,
+                                 path.basename(filename))
+
+    def _rgba_to_indexed(self, cf: ColorFormat, pixels):
+        from PIL import Image
+
+        # there is no palette to preserve, always quantize
+        h, w = pixels.shape[:2]
+        palette, indices = PngQuant(256 if cf is None else cf.ncolors) \
+            .quantize_indexed(Image.fromarray(pixels, "RGBA"))
+        self._palette_to_indexed(cf, list(palette), w, h, indices, "rgba")
+
+    def _palette_to_indexed(self, cf: ColorFormat, palette: List, w: int,
+                            h: int, rows, name: str):
+        auto_cf = cf is None
 
         palette_len = len(palette)
         if auto_cf:
@@ -957,7 +1771,7 @@ class LVGLImage:
         if palette_len != cf.ncolors:
             if not auto_cf:
                 logging.warning(
-                    f"{path.basename(filename)} palette: {palette_len}, "
+                    f"{name} palette: {palette_len}, "
                     f"extended to: {cf.ncolors}")
             palette += [(255, 255, 255, 0)] * (cf.ncolors - palette_len)
 
@@ -968,94 +1782,43 @@ class LVGLImage:
         for (r, g, b, a) in palette:
             rawdata += uint32_t((a << 24) | (r << 16) | (g << 8) | (b << 0))
 
-        # pack data if not in I8 format
-        if cf == ColorFormat.I8:
-            for e in rows:
-                if self.nema_gfx:
-                    e = bytearray((x >> 4) | ((x & 0x0F) << 4) for x in e)
-                rawdata += e
-        else:
-            for e in png.pack_rows(rows, cf.bpp):
-                rawdata += e
+        # pack data if not in I8 format, nema_gfx swaps the I8 nibbles
+        if not isinstance(rows, np.ndarray):
+            rows = np.asarray(list(rows), dtype=np.uint8)
+        rawdata += pack_bits(rows.reshape(h, w),
+                             cf.bpp, nibble_swap=self.nema_gfx and cf == ColorFormat.I8)
 
         self.set_data(cf, w, h, rawdata)
 
-    def _png_to_alpha_only(self, cf: ColorFormat, filename: str):
-        reader = png.Reader(str(filename))
-        w, h, rows, info = reader.asRGBA8()
-        if not info['alpha']:
-            raise FormatError(f"{filename} has no alpha channel")
-
-        rawdata = bytearray()
-        if cf == ColorFormat.A8:
-            for row in rows:
-                A = row[3::4]
-                for e in A:
-                    rawdata += uint8_t(e)
-        else:
-            shift = 8 - cf.bpp
-            mask = 2**cf.bpp - 1
-            rows = [[(a >> shift) & mask for a in row[3::4]] for row in rows]
-            for row in png.pack_rows(rows, cf.bpp):
-                rawdata += row
-
-        self.set_data(cf, w, h, rawdata)
+    def _rgba_to_alpha_only(self, cf: ColorFormat, pixels):
+        h, w = pixels.shape[:2]
+        self.set_data(cf, w, h, bytearray(pack_rgba(pixels, cf)))
 
     def sRGB_to_linear(self, x):
-        if x < 0.04045:
-            return x / 12.92
-        return pow((x + 0.055) / 1.055, 2.4)
+        return srgb_to_linear(x)
 
     def linear_to_sRGB(self, y):
-        if y <= 0.0031308:
-            return 12.92 * y
-        return 1.055 * pow(y, 1 / 2.4) - 0.055
+        return linear_to_srgb(y)
 
-    def _png_to_al88(self, cf: ColorFormat, filename: str):
-        reader = png.Reader(str(filename))
-        w, h, rows, info = reader.asRGBA8()
-        if not info['alpha']:
-            raise FormatError(f"{filename} has no alpha channel")
+    def _rgba_to_al88(self, cf: ColorFormat, pixels):
+        h, w = pixels.shape[:2]
+        self.set_data(ColorFormat.AL88, w, h,
+                      bytearray(pack_rgba(pixels, ColorFormat.AL88)))
 
-        rawdata = bytearray()
-        for row in rows:
-            R = row[0::4]
-            G = row[1::4]
-            B = row[2::4]
-            A = row[3::4]
-            for r, g, b, a in zip(R, G, B, A):
-                # Calculate luminance using ITU-R BT.709 coefficients
-                r_linear = self.sRGB_to_linear(r / 255.0)
-                g_linear = self.sRGB_to_linear(g / 255.0)
-                b_linear = self.sRGB_to_linear(b / 255.0)
-                luma = 0.2126 * r_linear + 0.7152 * g_linear + 0.0722 * b_linear
-                luma_byte = int(self.linear_to_sRGB(luma) * 255)
-                # AL88: low byte = luminance, high byte = alpha
-                rawdata += uint8_t(luma_byte)  # L
-                rawdata += uint8_t(a)          # A
-
-        self.set_data(ColorFormat.AL88, w, h, rawdata)
-
-    def _png_to_luma_only(self, cf: ColorFormat, filename: str):
-        reader = png.Reader(str(filename))
-        w, h, rows, info = reader.asRGBA8()
-        rawdata = bytearray()
-        for row in rows:
-            R = row[0::4]
-            G = row[1::4]
-            B = row[2::4]
-            A = row[3::4]
-            for r, g, b, a in zip(R, G, B, A):
-                r, g, b, a = color_pre_multiply(r, g, b, a, self.background)
-                r = self.sRGB_to_linear(r / 255.0)
-                g = self.sRGB_to_linear(g / 255.0)
-                b = self.sRGB_to_linear(b / 255.0)
-                luma = 0.2126 * r + 0.7152 * g + 0.0722 * b
-                rawdata += uint8_t(int(self.linear_to_sRGB(luma) * 255))
+    def _rgba_to_luma_only(self, cf: ColorFormat, pixels):
+        h, w = pixels.shape[:2]
+        self.set_data(ColorFormat.L8, w, h,
+                      bytearray(pack_rgba(pixels, ColorFormat.L8, self.background)))
 
-        self.set_data(ColorFormat.L8, w, h, rawdata)
+    def _rgba_to_colormap(self, cf, pixels):
+        h, w = pixels.shape[:2]
+        self.set_data(cf, w, h, pack_colormap(pixels, cf, self.background,
+                                              self.rgb565_dither))
 
-    def _png_to_colormap(self, cf, filename: str):
+    def _png_to_colormap_reference(self, cf, filename: str):
+        """
+        Pixel by pixel packing, kept as reference for pack_colormap parity check
+        """
 
         if cf == ColorFormat.ARGB8888:
 
@@ -1199,6 +1962,96 @@ class RLEHeader:
         return binary
 
 
+def rle_encode(data: bytes, blksize: int, threshold=16) -> bytearray:
+    """
+    Single pass LVGL RLE encoder, emits the same stream as
+    RLEImage.rle_compress_reference, except that a final literal longer than
+    127 blocks is split where the reference stream is broken.
+
+    Run boundaries of blksize-byte blocks are found over the whole buffer at
+    once, then one packet is emitted per repeat run or literal sequence.
+    """
+    data = memoryview(data).cast('B')
+    nfull = len(data) // blksize
+    if nfull == 0:
+        return bytearray()
+
+    # trailing bytes not forming a full block are a run of their own,
+    # never equal to any other block
+    nblocks = nfull + (1 if len(data) % blksize else 0)
+    blocks = np.frombuffer(data, dtype=np.uint8, count=nfull * blksize)
+    if blksize in (1, 2, 4):
+        blocks = blocks.view(f'<u{blksize}')
+        changed = blocks[1:] != blocks[:-1]
+    else:
+        blocks = blocks.reshape(nfull, blksize)
+        changed = np.any(blocks[1:] != blocks[:-1], axis=1)
+
+    run_starts = np.concatenate(([0], np.flatnonzero(changed) + 1))
+    if nblocks > nfull:
+        run_starts = np.append(run_starts, nfull)
+    run_ends = np.append(run_starts[1:], nblocks)
+    # a literal sequence stops in front of a run repeating more than threshold
+    long_starts = run_starts[run_ends - run_starts > threshold + 1].tolist()
+    run_starts = run_starts.tolist()
+    run_ends = run_ends.tolist()
+
+    compressed = bytearray()
+    index = 0
+    while index < nfull:
+        run = bisect.bisect_right(run_starts, index) - 1
+        repeat_cnt = min(run_ends[run] - index, 127)
+        start = index * blksize
+        if repeat_cnt >= threshold:
+            compressed.append(repeat_cnt)
+            compressed += data[start:start + blksize]
+            index += repeat_cnt
+            continue
+
+        long_run = bisect.bisect_right(long_starts, index)
+        long_run = long_starts[long_run] if long_run < len(long_starts) else None
+        # the literal length is capped to 127 when a run starts that far away
+        capped = bisect.bisect_left(run_starts, index + 126)
+        capped = run_starts[capped] if capped < len(run_starts) else None
+        if long_run is not None and (capped is None or long_run < capped):
+            nonrepeat_cnt = long_run - index + 1
+        elif capped is not None:
+            nonrepeat_cnt = 127
+        else:
+            # the reference does not cap the last literal and overflows the
+            # control byte when more than 127 blocks are left
+            nonrepeat_cnt = min(nblocks - index, 127)
+
+        compressed.append(nonrepeat_cnt | 0x80)
+        compressed += data[start:start + nonrepeat_cnt * blksize]
+        index += nonrepeat_cnt
+
+    return compressed
+
+
+def rle_decode(data: bytes, blksize: int, max_len: int = None) -> bytearray:
+    """
+    Decode LVGL RLE stream produced by rle_encode, stop once max_len bytes
+    are decoded
+    """
+    data = memoryview(data).cast('B')
+    decompressed = bytearray()
+    index = 0
+    while index < len(data):
+        if max_len is not None and len(decompressed) >= max_len:
+            break
+        ctrl = data[index]
+        index += 1
+        if ctrl & 0x80:
+            size = (ctrl & 0x7f) * blksize
+            decompressed += data[index:index + size]
+            index += size
+        else:
+            decompressed += bytes(data[index:index + blksize]) * ctrl
+            index += blksize
+    return decompressed
+
+
 class RLEImage(LVGLImage):
 
     def __init__(self,
@@ -1225,6 +2078,16 @@ class RLEImage(LVGLImage):
             f.write(compressed)
 
     def rle_compress(self, data: bytearray, blksize: int, threshold=16):
+        return bytes(rle_encode(data, blksize, threshold))
+
+    def rle_decompress(self, data: bytearray, blksize: int):
+        return bytes(rle_decode(data, blksize))
+
+    def rle_compress_reference(self, data: bytearray, blksize: int,
+                               threshold=16):
+        """
+        Block by block RLE compression, kept as reference for rle_encode
+        """
         index = 0
         data_len = len(data)
         compressed_data = []
@@ -1325,30 +2188,272 @@ class RAWImage():
 
     def to_c_array(self,
                    filename: str,
-                   outputname: str = None):
+                   outputname: str = None,
+                   lv_version: str = "v9"):
         # Image size is set to zero, to let PNG or JPEG decoder to handle it
         # Stride is meaningless for RAW image
         write_c_array_file(0, 0, 0, self.cf, filename, outputname,
-                           False, CompressMethod.NONE, self.data)
+                           False, CompressMethod.NONE, self.data,
+                           lv_version=lv_version)
+
+    def to_c_array_bytes(self, outputname: str, lv_version: str = "v9") -> bytes:
+        f = io.StringIO()
+        write_c_array(f, 0, 0, 0, self.cf, outputname, False,
+                      CompressMethod.NONE, self.data, lv_version=lv_version)
+        return f.getvalue().encode("utf-8")
 
     def from_file(self,
                   filename: str,
                   cf: ColorFormat = None):
+        with open(filename, "rb") as f:
+            return self.from_bytes(f.read(), cf)
+
+    def from_bytes(self,
+                   data: bytes,
+                   cf: ColorFormat = None):
         if cf not in RAWImage.CF_SUPPORTED:
             raise RAWImage.NotSupported(f"Invalid color format: {cf.name}")
 
-        with open(filename, "rb") as f:
-            self.data = f.read()
+        self.data = data
         self.cf = cf
         return self
 
 
+def skyline_pack(sizes: List, width: int, padding: int = 0):
+    """
+    Place (w, h) rectangles in a strip of given width, skyline bottom-left:
+    tallest first, each at the position with the lowest resulting top edge.
+    Return ([(x, y)] in input order, used height). padding pixels are kept
+    between rectangles, not along the strip border.
+    """
+    width += padding  # the right most rectangle needs no padding
+    skyline = [[0, 0, width]]  # segments [x, y, w], left to right
+    positions = [None] * len(sizes)
+    order = sorted(range(len(sizes)),
+                   key=lambda i: (-sizes[i][1], -sizes[i][0], i))
+    for i in order:
+        w, h = sizes[i][0] + padding, sizes[i][1] + padding
+        if w > width:
+            raise ParameterError(f"{sizes[i][0]}x{sizes[i][1]} wider than "
+                                 f"atlas width {width - padding}")
+        best = None
+        for s in range(len(skyline)):
+            x = skyline[s][0]
+            if x + w > width:
+                break
+            y, end, j = 0, x + w, s
+            while skyline[j][0] < end:
+                y = max(y, skyline[j][1])
+                j += 1
+                if j == len(skyline):
+                    break
+            if best is None or (y + h, x) < (best[1] + h, best[0]):
+                best = (x, y, s)
+
+        x, y, s = best
+        positions[i] = (x, y)
+        # replace the covered segments with the new top edge
+        end = x + w
+        j = s
+        while j < len(skyline) and skyline[j][0] + skyline[j][2] <= end:
+            j += 1
+        tail = []
+        if j < len(skyline) and skyline[j][0] < end:
+            sx, sy, sw = skyline[j]
+            tail = [[end, sy, sx + sw - end]]
+            j += 1
+        skyline[s:j] = [[x, y + h, w]] + tail
+        merged = [skyline[0]]
+        for seg in skyline[1:]:
+            if seg[1] == merged[-1][1]:
+                merged[-1][2] += seg[2]
+            else:
+                merged.append(seg)
+        skyline = merged
+
+    height = max((y + sizes[i][1] for i, (x, y) in enumerate(positions)),
+                 default=0)
+    return positions, height
+
+
+ATLAS_RECT_TYPE = '''
+#ifndef LVGL_ATLAS_RECT_DEFINED
+#define LVGL_ATLAS_RECT_DEFINED
+typedef struct {
+    const char * name;
+    uint16_t x;
+    uint16_t y;
+    uint16_t w;
+    uint16_t h;
+} lvgl_atlas_rect_t;
+#endif
+
+'''
+
+
+class LVGLAtlas:
+    """
+    Several images packed into one LVGLImage, so the device keeps a single
+    image (one header, one palette, one cache entry) and draws sub-rectangles
+    of it. rects holds (name, x, y, w, h) of every sprite in adding order.
+    """
+
+    def __init__(self, width: int = 0, padding: int = 0) -> None:
+        self.width = width  # 0 to choose the width of the smallest area
+        self.padding = padding
+        self.sprites = []  # (name, HxWx4 RGBA array)
+        self.rects = []
+        self.image = None
+
+    def add(self, name: str, pixels):
+        """
+        Add a HxWx4 uint8 RGBA array, name is used as C identifier suffix
+        """
+        name = c_array_varname(name)
+        if any(name == n for n, _ in self.sprites):
+            raise ParameterError(f"duplicated sprite name: {name}")
+        self.sprites.append((name, pixels))
+        return self
+
+    def add_png(self, filename: str, name: str = None):
+        pixels, _ = read_png_rgba(filename)
+        return self.add(name or path.basename(str(filename)), pixels)
+
+    def _layout(self):
+        sizes = [(p.shape[1], p.shape[0]) for _, p in self.sprites]
+        if self.width:
+            return (self.width,) + skyline_pack(sizes, self.width, self.padding)
+
+        # try widths around the square root of the total area
+        widest = max(w for w, _ in sizes)
+        area = sum((w + self.padding) * (h + self.padding) for w, h in sizes)
+        side = int(area ** 0.5)
+        best = None
+        for width in sorted({max(widest, side * k // 8) for k in range(6, 17)}):
+            positions, height = skyline_pack(sizes, width, self.padding)
+            key = (width * height, abs(width - height))
+            if best is None or key < best[0]:
+                best = (key, width, positions, height)
+        return best[1:]
+
+    def build(self, cf: ColorFormat = None, align: int = 1, **kwargs):
+        """
+        Pack all sprites and convert the atlas with LVGLImage.from_rgba,
+        kwargs are passed on to it. Return the atlas LVGLImage.
+        """
+        if not self.sprites:
+            raise ParameterError("empty atlas")
+        width, positions, height = self._layout()
+        atlas = np.zeros((height, width, 4), dtype=np.uint8)
+        self.rects = []
+        for (name, pixels), (x, y) in zip(self.sprites, positions):
+            h, w = pixels.shape[:2]
+            atlas[y:y + h, x:x + w] = pixels
+            self.rects.append((name, x, y, w, h))
+
+        self.image = LVGLImage().from_rgba(atlas, cf, **kwargs)
+        self.image.adjust_stride(align=align)
+        logging.info(f"atlas: {len(self.rects)} sprites in {width}x{height}, "
+                     f"{sum(w * h for *_, w, h in self.rects) * 100 // (width * height)}% used")
+        return self.image
+
+    def sub_images(self, compress: CompressMethod = CompressMethod.NONE) -> bool:
+        """
+        Sprites can be drawn as standalone lv_image_dsc_t pointing into the
+        atlas data: uncompressed, byte aligned pixels, no palette or alpha map
+        """
+        cf = self.image.cf
+        return (compress == CompressMethod.NONE and cf.bpp >= 8
+                and not cf.is_indexed and cf is not ColorFormat.RGB565A8)
+
+    def write_c_table(self, f, varname: str,
+                      compress: CompressMethod = CompressMethod.NONE):
+        """
+        Write the sub-rectangle table and, if possible, one lv_image_dsc_t
+        per sprite sharing the atlas pixel data
+        """
+        img = self.image
+        f.write(ATLAS_RECT_TYPE)
+        f.write(f"const lvgl_atlas_rect_t {varname}_rects[] = {{\n")
+        for name, x, y, w, h in self.rects:
+            f.write(f'  {{"{name}", {x}, {y}, {w}, {h}}},\n')
+        f.write("};\n\n")
+        if not self.sub_images(compress):
+            return
+
+        flags = " | LV_IMAGE_FLAGS_PREMULTIPLIED" if img.premultiplied else ""
+        bpp = img.cf.bpp // 8
+        for name, x, y, w, h in self.rects:
+            f.write(f'''const lv_image_dsc_t {varname}_{name} = {{
+  .header = {{
+    .magic = LV_IMAGE_HEADER_MAGIC,
+    .cf = LV_COLOR_FORMAT_{img.cf.name},
+    .flags = 0{flags},
+    .w = {w},
+    .h = {h},
+    .stride = {img.stride},
+    .reserved_2 = 0,
+  }},
+  .data_size = {(h - 1) * img.stride + w * bpp},
+  .data = {varname}_map + {y * img.stride + x * bpp},
+  .reserved = NULL,
+}};
+
+''')
+
+    def to_c_array_bytes(self, outputname: str,
+                         compress: CompressMethod = CompressMethod.NONE) -> bytes:
+        """
+        Return the atlas '.c' file content: image, rect table, sub images
+        """
+        f = io.StringIO()
+        f.write(self.image.to_c_array_bytes(outputname, compress).decode("utf-8"))
+        self.write_c_table(f, outputname, compress)
+        return f.getvalue().encode("utf-8")
+
+    def to_c_header_bytes(self, outputname: str,
+                          compress: CompressMethod = CompressMethod.NONE) -> bytes:
+        """
+        Return the '.h' declaring the atlas, its rect table and sprite indices
+        """
+        guard = outputname.upper()
+        lines = [f"#ifndef {guard}_H", f"#define {guard}_H", "",
+                 '#ifdef __cplusplus', 'extern "C" {', '#endif', "",
+                 '#if defined(LV_LVGL_H_INCLUDE_SIMPLE)', '#include "lvgl.h"',
+                 '#elif defined(LV_LVGL_H_INCLUDE_SYSTEM)', '#include <lvgl.h>',
+                 '#else', '#include "lvgl/lvgl.h"', '#endif',
+                 ATLAS_RECT_TYPE.rstrip("\n"), "", "enum {"]
+        lines += [f"    {guard}_{name.upper()}," for name, *_ in self.rects]
+        lines += [f"    {guard}_COUNT", "};", "",
+                  f"LV_IMAGE_DECLARE({outputname});",
+                  f"extern const lvgl_atlas_rect_t {outputname}_rects[{guard}_COUNT];"]
+        if self.sub_images(compress):
+            lines += [f"LV_IMAGE_DECLARE({outputname}_{name});" for name, *_ in self.rects]
+        lines += ["", '#ifdef __cplusplus', '} /*extern "C"*/', '#endif', "",
+                  f"#endif /*{guard}_H*/", ""]
+        return "\n".join(lines).encode("utf-8")
+
+    def to_json_bytes(self) -> bytes:
+        """
+        Return the rect table as json, for '.bin' or '.png' atlas output
+        """
+        img = self.image
+        return json.dumps({
+            "cf": img.cf.name, "w": img.w, "h": img.h, "stride": img.stride,
+            "sprites": [dict(name=name, x=x, y=y, w=w, h=h)
+                        for name, x, y, w, h in self.rects],
+        }, indent=1).encode("utf-8")
+
+
 class OutputFormat(Enum):
     C_ARRAY = "C"
     BIN_FILE = "BIN"
     PNG_FILE = "PNG"  # convert to lvgl image and then to png
 
 
+MANIFEST_VERSION = 1  # bump when the output of the same options changes
+
+
 class PNGConverter:
 
     def __init__(self,
@@ -1362,7 +2467,9 @@ class PNGConverter:
                  compress: CompressMethod = CompressMethod.NONE,
                  keep_folder=True,
                  rgb565_dither=False,
-                 nema_gfx=False) -> None:
+                 nema_gfx=False,
+                 compress_options: dict = None,
+                 lv_version: str = "v9") -> None:
         self.files = files
         self.cf = cf
         self.ofmt = ofmt
@@ -1375,6 +2482,8 @@ class PNGConverter:
         self.background = background
         self.rgb565_dither = rgb565_dither
         self.nema_gfx = nema_gfx
+        self.compress_options = compress_options or {}
+        self.lv_version = lv_version
 
     def _replace_ext(self, input, ext, outputname: str = None):
         if self.keep_folder:
@@ -1390,34 +2499,153 @@ class PNGConverter:
         output = path.join(self.output, output)
         return output
 
-    def convert(self, outputname: str):
+    def _output_path(self, f, outputname: str = None):
+        if self.cf in (ColorFormat.RAW, ColorFormat.RAW_ALPHA) \
+                or self.ofmt == OutputFormat.C_ARRAY:
+            return self._replace_ext(f, ".c", outputname)
+        if self.ofmt == OutputFormat.BIN_FILE:
+            return self._replace_ext(f, ".bin")
+        return self._replace_ext(f, ".png")
+
+    def _options_key(self, outputname: str = None) -> str:
+        """
+        Hash of everything besides the source file that changes the output
+        """
+        options = {
+            "version": MANIFEST_VERSION,
+            "cf": self.cf.name if self.cf else "AUTO",
+            "ofmt": self.ofmt.value,
+            "align": self.align,
+            "premultiply": self.premultiply,
+            "compress": self.compress.name,
+            "compress_options": self.compress_options,
+            "background": self.background,
+            "rgb565_dither": self.rgb565_dither,
+            "nema_gfx": self.nema_gfx,
+            "keep_folder": self.keep_folder,
+            "lv_version": self.lv_version,
+            "outputname": outputname,
+        }
+        return hashlib.sha256(json.dumps(options, sort_keys=True)
+                              .encode()).hexdigest()
+
+    def _convert_one(self, f, outputname: str = None):
+        """
+        Convert one file, return its data_len. Only the size goes back to the
+        parent process, not the whole image
+        """
+        if self.cf in (ColorFormat.RAW, ColorFormat.RAW_ALPHA):
+            # Process RAW image explicitly
+            img = RAWImage().from_file(f, self.cf)
+            img.to_c_array(self._replace_ext(f, ".c", outputname), outputname=outputname,
+                           lv_version=self.lv_version)
+            return None
+
+        img = LVGLImage().from_png(f, self.cf, background=self.background, rgb565_dither=self.rgb565_dither, nema_gfx=self.nema_gfx)
+        img.adjust_stride(align=self.align)
+
+        if self.premultiply:
+            img.premultiply()
+        img.compress_options = self.compress_options
+        if self.ofmt == OutputFormat.BIN_FILE:
+            img.to_bin(self._replace_ext(f, ".bin"),
+                       compress=self.compress)
+        elif self.ofmt == OutputFormat.C_ARRAY:
+            img.to_c_array(self._replace_ext(f, ".c", outputname),
+                           compress=self.compress,
+                           outputname=outputname,
+                           lv_version=self.lv_version)
+        elif self.ofmt == OutputFormat.PNG_FILE:
+            img.to_png(self._replace_ext(f, ".png"))
+        if img.compress_report:
+            logging.info(f"{path.basename(f)}: {img.compress_report}")
+        return img.data_len
+
+    def convert(self, outputname: str, jobs: int = 1, manifest: str = None):
+        """
+        Convert all files, return [(file, data_len)] in input order.
+        jobs > 1 converts files in a process pool. With a manifest path, files
+        whose content hash and options match the manifest of the previous run
+        and whose output still exists are skipped.
+        """
         if len(self.files) > 1 and outputname is not None:
             raise BaseException(f"Cannot specify output name when converting more than one file.")
 
-        output = []
+        options = self._options_key(outputname)
+        entries = {}
+        if manifest and path.exists(manifest):
+            with open(manifest, "r", encoding="utf-8") as fp:
+                entries = json.load(fp)
+
+        todo, hashes = [], {}
         for f in self.files:
-            if self.cf in (ColorFormat.RAW, ColorFormat.RAW_ALPHA):
-                # Process RAW image explicitly
-                img = RAWImage().from_file(f, self.cf)
-                img.to_c_array(self._replace_ext(f, ".c", outputname), outputname=outputname)
-            else:
-                img = LVGLImage().from_png(f, self.cf, background=self.background, rgb565_dither=self.rgb565_dither, nema_gfx=self.nema_gfx)
-                img.adjust_stride(align=self.align)
-
-                if self.premultiply:
-                    img.premultiply()
-                output.append((f, img))
-                if self.ofmt == OutputFormat.BIN_FILE:
-                    img.to_bin(self._replace_ext(f, ".bin"),
-                               compress=self.compress)
-                elif self.ofmt == OutputFormat.C_ARRAY:
-                    img.to_c_array(self._replace_ext(f, ".c", outputname),
-                                   compress=self.compress,
-                                   outputname=outputname)
-                elif self.ofmt == OutputFormat.PNG_FILE:
-                    img.to_png(self._replace_ext(f, ".png"))
+            if manifest:
+                with open(f, "rb") as fp:
+                    hashes[str(f)] = hashlib.sha256(fp.read()).hexdigest()
+                entry = entries.get(str(f))
+                if entry and entry["hash"] == hashes[str(f)] \
+                        and entry["options"] == options \
+                        and path.exists(entry["output"]):
+                    continue
+            todo.append(f)
+        if len(todo) < len(self.files):
+            logging.info(f"skip {len(self.files) - len(todo)} unchanged files")
+
+        outputs = [self._output_path(f, outputname) for f in todo]
+        if len(set(outputs)) != len(outputs):
+            logging.warning("several files map to the same output name, "
+                            "the one written last wins")
+
+        if jobs > 1 and len(todo) > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                sizes = list(pool.map(self._convert_one, todo,
+                                      [outputname] * len(todo),
+                                      chunksize=max(1, len(todo) // (jobs * 8))))
+        else:
+            sizes = [self._convert_one(f, outputname) for f in todo]
 
-        return output
+        if manifest:
+            for f, output in zip(todo, outputs):
+                entries[str(f)] = {"hash": hashes[str(f)], "options": options,
+                                   "output": output}
+            os.makedirs(path.dirname(manifest) or ".", exist_ok=True)
+            tmp = manifest + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as fp:
+                json.dump(entries, fp, indent=1, sort_keys=True)
+            os.replace(tmp, manifest)
+
+        return [(f, size) for f, size in zip(todo, sizes) if size is not None]
+
+    def convert_atlas(self, name: str, width: int = 0, padding: int = 0):
+        """
+        Pack all files into one atlas image named name, written as name.c
+        plus name.h for C output, or name.bin/.png plus name.json
+        """
+        atlas = LVGLAtlas(width, padding)
+        for f in self.files:
+            atlas.add_png(f)
+        img = atlas.build(self.cf, align=self.align, background=self.background,
+                          rgb565_dither=self.rgb565_dither, nema_gfx=self.nema_gfx)
+        if self.premultiply:
+            img.premultiply()
+        img.compress_options = self.compress_options
+
+        base = path.join(self.output, name)
+        img._check_dir(base)
+        if self.ofmt == OutputFormat.C_ARRAY:
+            outputs = {".c": atlas.to_c_array_bytes(name, self.compress),
+                       ".h": atlas.to_c_header_bytes(name, self.compress)}
+        elif self.ofmt == OutputFormat.BIN_FILE:
+            outputs = {".bin": img.to_bin_bytes(self.compress),
+                       ".json": atlas.to_json_bytes()}
+        else:
+            outputs = {".png": img.to_png_bytes(), ".json": atlas.to_json_bytes()}
+        for ext, data in outputs.items():
+            if data is None:
+                continue
+            with open(base + ext, "wb") as fp:
+                fp.write(data)
+        return atlas
 
 
 def main():
@@ -1446,7 +2674,18 @@ def main():
     parser.add_argument('--compress',
                         help=("Binary data compress method, default to NONE"),
                         default="NONE",
-                        choices=["NONE", "RLE", "LZ4"])
+                        choices=["NONE", "RLE", "LZ4", "AUTO"])
+    parser.add_argument('--auto-policy',
+                        help=("AUTO compress: keep the smallest output, or the "
+                              "fastest to decode within --auto-budget"),
+                        default="smallest",
+                        choices=["smallest", "fastest"])
+    parser.add_argument('--auto-budget',
+                        help=("AUTO compress: max compressed/raw size ratio "
+                              "for the fastest policy, default to 1.0"),
+                        default=1.0,
+                        type=float,
+                        metavar='ratio')
 
     parser.add_argument('--align',
                         help="stride alignment in bytes for bin image",
@@ -1460,6 +2699,10 @@ def main():
                         type=lambda x: int(x, 0),
                         metavar='color',
                         nargs='?')
+    parser.add_argument('--lv-version',
+                        help="LVGL version of C array output, default to v9",
+                        default="v9",
+                        choices=["v8", "v9"])
     parser.add_argument('--nemagfx', action='store_true',
                     help="export color palette for I8 images in a format compatible with NEMA accelerator", default=False)
     parser.add_argument('-o',
@@ -1469,6 +2712,30 @@ def main():
     parser.add_argument('--name',
                         default=None,
                         help="Specify name for output file. Only applies when input is a file, not a directory. (Also used for variable name inside .c file when format is 'C')")
+    parser.add_argument('-j', '--jobs',
+                        help="convert files in parallel with N processes, default to 1",
+                        default=1,
+                        type=int,
+                        metavar='N')
+    parser.add_argument('--incremental', action='store_true',
+                        help=("skip files whose content and options match the "
+                              "manifest in output folder from the previous run"),
+                        default=False)
+    parser.add_argument('--atlas',
+                        default=None,
+                        metavar='name',
+                        help=("pack all input images into one atlas image "
+                              "with a table of sprite rectangles"))
+    parser.add_argument('--atlas-width',
+                        help="atlas width in pixels, default to the width of smallest area",
+                        default=0,
+                        type=int,
+                        metavar='px')
+    parser.add_argument('--atlas-padding',
+                        help="transparent pixels between atlas sprites, default to 0",
+                        default=0,
+                        type=int,
+                        metavar='px')
     parser.add_argument('-v', '--verbose', action='store_true')
     parser.add_argument(
         'input', help="the filename or folder to be recursively converted")
@@ -1478,7 +2745,7 @@ def main():
     if path.isfile(args.input):
         files = [args.input]
     elif path.isdir(args.input):
-        files = list(Path(args.input).rglob("*.[pP][nN][gG]"))
+        files = sorted(Path(args.input).rglob("*.[pP][nN][gG]"))
 
         if args.name is not None:
             raise BaseException(f"invalid input: cannot specify --name when input is a directory")
@@ -1509,10 +2776,23 @@ def main():
                              compress=compress,
                              keep_folder=False,
                              rgb565_dither=args.rgb565dither,
-                             nema_gfx=args.nemagfx)
-    output = converter.convert(args.name)
-    for f, img in output:
-        logging.info(f"len: {img.data_len} for {path.basename(f)} ")
+                             nema_gfx=args.nemagfx,
+                             compress_options={"policy": args.auto_policy,
+                                               "budget": args.auto_budget},
+                             lv_version=args.lv_version)
+    if args.atlas is not None:
+        if cf in (ColorFormat.RAW, ColorFormat.RAW_ALPHA):
+            raise BaseException(f"invalid input: RAW images cannot be packed into an atlas")
+        if args.lv_version == "v8":
+            raise BaseException(f"invalid input: atlas output is for LVGL v9 only")
+        atlas = converter.convert_atlas(args.atlas, args.atlas_width, args.atlas_padding)
+        print(f"done {len(files)} files, atlas {atlas.image.w}x{atlas.image.h}")
+        return
+
+    manifest = path.join(args.output, ".lvgl_manifest.json") if args.incremental else None
+    output = converter.convert(args.name, jobs=args.jobs, manifest=manifest)
+    for f, data_len in output:
+        logging.info(f"len: {data_len} for {path.basename(f)} ")
 
     print(f"done {len(files)} files")
 
@@ -1539,6 +2819,93 @@ def test_raw():
     img.to_c_array("output/cogwheel-raw.c")
 
 
+def test_parity():
+    """
+    Check the array based packing against the pixel by pixel reference path
+    """
+    import tempfile
+    logging.basicConfig(level=logging.INFO)
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, (37, 53, 4), dtype=np.uint8)
+    pixels[:8, :, 3] = rng.choice([0, 255], (8, 53))  # fully (in)visible rows
+
+    with tempfile.TemporaryDirectory() as tmp:
+        f = path.join(tmp, "parity.png")
+        with open(f, "wb") as fp:
+            png.Writer(53, 37, greyscale=False, alpha=True).write(
+                fp, pixels.reshape(37, -1).tolist())
+
+        for cf in ColorFormat:
+            if not cf.is_colormap:
+                continue
+            for background in (0x00_00_00, 0x12_34_56, 0xFF_FF_FF):
+                for dither in (False, True):
+                    fast = LVGLImage().from_png(f, cf, background=background,
+                                                rgb565_dither=dither)
+                    ref = LVGLImage()
+                    ref.background = background
+                    ref.rgb565_dither = dither
+                    ref._png_to_colormap_reference(cf, f)
+                    assert fast.data == ref.data, \
+                        f"{cf.name} {background:06x} dither: {dither}"
+                    logging.info(f"parity ok: {cf.name}, bg: {background:06x}, "
+                                 f"dither: {dither}")
+
+        # RLE stream against the reference encoder, runs from quantized data,
+        # the reference stream only counts where it decodes back to the data
+        rle = RLEImage()
+        runs = (pixels >> 6).tobytes() + bytes(300)
+        for blksize in (1, 2, 3, 4):
+            # a literal followed by short padding run: final literal over 127
+            tail = pixels.tobytes()[:120 * blksize] + bytes(15 * blksize)
+            for data in (runs, runs[:-1], pixels.tobytes(), tail):
+                fast = rle.rle_compress(data, blksize)
+                ref = rle.rle_compress_reference(data, blksize)
+                if len(data) % blksize == 0:
+                    assert rle.rle_decompress(fast, blksize) == data, \
+                        f"RLE {blksize} round trip"
+                    if rle.rle_decompress(ref, blksize) != data:
+                        continue
+                assert fast == ref, f"RLE {blksize}"
+        logging.info("parity ok: RLE")
+
+        # L8 / AL88 luma tables, every level of every channel plus random mix
+        def luma_reference(r, g, b):
+            r, g, b = (srgb_to_linear(c / 255.0) for c in (r, g, b))
+            return int(linear_to_srgb(0.2126 * r + 0.7152 * g + 0.0722 * b) * 255)
+
+        levels = np.arange(256, dtype=np.uint8)
+        zero, full = np.zeros(256, np.uint8), np.full(256, 255, np.uint8)
+        rows = [np.stack(c, axis=-1) for c in (
+            (levels, zero, zero, full), (zero, levels, zero, full),
+            (zero, zero, levels, full), (levels, levels, levels, full),
+            (full, full, full, levels), (levels, full, levels[::-1], levels))]
+        rows.append(pixels.reshape(-1, 4)[:256])
+        luma_pixels = np.stack(rows)
+        for background in (0x00_00_00, 0x12_34_56, 0xFF_FF_FF):
+            img = LVGLImage()
+            img.background = background
+            img._rgba_to_luma_only(ColorFormat.L8, luma_pixels)
+            expect = bytes(luma_reference(*color_pre_multiply(r, g, b, a, background)[:3])
+                           for r, g, b, a in luma_pixels.reshape(-1, 4).tolist())
+            assert img.data == expect, f"L8 {background:06x}"
+        img._rgba_to_al88(ColorFormat.AL88, luma_pixels)
+        expect = b''.join(bytes((luma_reference(r, g, b), a))
+                          for r, g, b, a in luma_pixels.reshape(-1, 4).tolist())
+        assert img.data == expect, "AL88"
+        logging.info("parity ok: L8, AL88")
+
+        # compressed bin round trip
+        for compress in CompressMethod:
+            img = LVGLImage().from_png(f, ColorFormat.RGB565A8)
+            img.adjust_stride(align=4)
+            img.to_bin(path.join(tmp, "parity.bin"), compress=compress)
+            back = LVGLImage().from_bin(path.join(tmp, "parity.bin"))
+            assert (back.cf, back.stride, back.data) == \
+                (img.cf, img.stride, img.data), f"bin {compress.name}"
+            logging.info(f"round trip ok: {compress.name}")
+
+
 if __name__ == "__main__":
     # test()
     # test_raw()
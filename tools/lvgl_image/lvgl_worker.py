@@ -0,0 +1,8 @@
+"""
+LVGL 转换进程池子进程的入口模块。
+
+spawn 子进程启动时会重新导入父进程的 __main__ (app.py：create_app、全部蓝图、Database 及本地迁移)，
+每次超时重启都要再来一遍。ConversionPool 拉起子进程时把 __main__ 临时指向本模块，
+子进程只导入转换需要的模块。
+"""
+from . import converter  # noqa: F401  预先导入 numpy / PIL / lvgl_utils，首个任务不再等待导入
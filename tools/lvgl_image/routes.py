@@ -1,11 +1,12 @@
-import os
 import io
-import uuid
-import shutil
-from flask import Blueprint, render_template, request, send_file, jsonify, current_app
-from werkzeug.utils import secure_filename
-from .lvgl_utils import LVGLImage, ColorFormat, OutputFormat, CompressMethod, RAWImage
-from PIL import Image
+import zipfile
+from flask import Blueprint, render_template, request, send_file, jsonify, current_app, url_for
+from .converter import parse_convert_options, convert_upload, compress_summary, preview_bin, preview_upload, collect_batch_files, batch_options, batch_header, check_upload, check_bin, ImageTooLarge
+from .lvgl_utils import Error as LVGLError
+from .lvgl_cache import conversion_cache
+from .lvgl_pool import conversion_pool, PoolBusy, JobTimeout
+from .lvgl_jobs import job_store
+from tools.config import Config
 from tools.database import d1
 from datetime import datetime
 
@@ -13,6 +14,8 @@ lvgl_image_bp = Blueprint('lvgl_image', __name__,
                           template_folder='templates', 
                           static_folder='static')
 
+USAGE_ROWS_PER_INSERT = 100 // 3  # D1 单条语句最多绑定 100 个参数，每行 3 个
+
 from tools.user.routes import get_uid_from_request
 
 def get_visitor_id():
@@ -44,14 +47,6 @@ def get_tool_config():
     except: pass
     return {"daily_limit_free": 20, "daily_limit_pro": 200, "is_public": 1}
 
-import os
-import io
-import uuid
-import shutil
-import glob
-from flask import Blueprint, render_template, request, send_file, jsonify, current_app
-# ... (其余导入保持不变)
-
 @lvgl_image_bp.route('/')
 def index():
     vid, logged, role = get_visitor_id()
@@ -72,6 +67,19 @@ def get_usage():
         return jsonify(success=True, remaining=max(0, limit - count))
     except: return jsonify(success=False)
 
+def busy_response(e):
+    resp = jsonify(success=False, error=str(e), retry_after=e.retry_after)
+    resp.status_code = 429
+    resp.headers['Retry-After'] = str(e.retry_after)
+    return resp
+
+@lvgl_image_bp.route('/pool_stats')
+def pool_stats():
+    # 监控：队列深度、忙碌进程数、排队/服务耗时 (仅管理员)
+    _, logged, role = get_visitor_id()
+    if not logged or role != 'admin': return jsonify(success=False, error="Forbidden"), 403
+    return jsonify(success=True, **conversion_pool.stats())
+
 @lvgl_image_bp.route('/convert', methods=['POST'])
 def convert():
     vid, logged, role = get_visitor_id()
@@ -86,58 +94,229 @@ def convert():
     file = request.files.get('file')
     if not file: return jsonify(success=False, error="No file"), 400
 
-    cf_str = request.form.get('cf', 'AUTO')
-    ofmt_str = request.form.get('ofmt', 'C')
-    compress_str = request.form.get('compress', 'NONE')
-    stride_align = int(request.form.get('align', 1))
-    bg_color = int(request.form.get('background', '#000000').replace('#', ''), 16)
-    target_w, target_h = request.form.get('target_w'), request.form.get('target_h')
-    lv_version = request.form.get('lv_version', 'v9')
-    custom_name = request.form.get('output_name', '').strip()
-    
-    task_dir = os.path.join(os.getcwd(), 'temp_lvgl', str(uuid.uuid4()))
-    os.makedirs(task_dir, exist_ok=True)
-    
     try:
-        cf = None if cf_str == "AUTO" else ColorFormat[cf_str]
-        out_name = secure_filename(custom_name if custom_name else os.path.splitext(file.filename)[0]).replace('-', '_').replace(' ', '_')
-        
-        if cf in [ColorFormat.RAW, ColorFormat.RAW_ALPHA]:
-            ipath = os.path.join(task_dir, secure_filename(file.filename))
-            file.save(ipath)
-            img = RAWImage().from_file(ipath, cf=cf)
-            opath = os.path.join(task_dir, f"{out_name}.c")
-            img.to_c_array(opath, outputname=out_name)
+        # 全内存流水线：不再创建 temp_lvgl 临时目录，兼容只读容器文件系统
+        opts = parse_convert_options(request.form, file.filename)
+        upload = file.read()
+        # 相同文件 + 相同参数直接命中缓存，跳过解码/打包/压缩 (仍计入配额)
+        key = conversion_cache.make_key(upload, opts)
+        hit = conversion_cache.get(key)
+        if hit:
+            download_name, data = hit
         else:
-            ipath = os.path.join(task_dir, "src.png")
-            with Image.open(file) as img_in:
-                img_rgba = img_in.convert("RGBA")
-                if target_w or target_h:
-                    tw = int(target_w) if (target_w and target_w.strip()) else None
-                    th = int(target_h) if (target_h and target_h.strip()) else None
-                    w, h = (tw, th) if (tw and th) else ((tw, int(img_rgba.height*(tw/img_rgba.width))) if tw else (int(img_rgba.width*(th/img_rgba.height)), th))
-                    img_rgba = img_rgba.resize((w, h), Image.Resampling.LANCZOS)
-                img_rgba.save(ipath, "PNG")
-            
-            img = LVGLImage().from_png(ipath, cf=cf, background=bg_color, rgb565_dither=(request.form.get('dither')=='true'), nema_gfx=(request.form.get('nemagfx')=='true'))
-            img.adjust_stride(align=stride_align)
-            if request.form.get('premultiply')=='true' and img.cf.has_alpha: img.premultiply()
-            
-            opath = os.path.join(task_dir, f"out_{out_name}")
-            if ofmt_str == 'C':
-                opath += ".c"
-                img.to_c_array(opath, compress=CompressMethod[compress_str], outputname=out_name)
-                if lv_version == 'v8':
-                    with open(opath, 'r', encoding='utf-8') as f: content = f.read().replace('lv_image_dsc_t', 'lv_img_dsc_t').replace('LV_COLOR_FORMAT_', 'LV_IMG_CF_TRUE_COLOR')
-                    with open(opath, 'w', encoding='utf-8') as f: f.write(content)
+            check_upload(upload, opts)
+            # 转换在独立进程池中执行，不阻塞当前 Web worker 的 GIL
+            download_name, data = conversion_pool.submit(convert_upload, upload, opts).wait()
+            conversion_cache.put(key, download_name, data)
+        d1.execute("INSERT INTO usage_logs (user_id, path, status) VALUES (?, ?, ?)", [vid, '/lvgl_image/convert', 200])
+        resp = send_file(io.BytesIO(data), as_attachment=True, download_name=download_name)
+        resp.headers['X-LVGL-Cache'] = 'HIT' if hit else 'MISS'
+        if opts['compress'] == 'AUTO': resp.headers['X-LVGL-Compress'] = compress_summary(download_name, data) or ''
+        return resp
+    except PoolBusy as e:
+        return busy_response(e)
+    except ImageTooLarge as e:
+        return jsonify(success=False, error=str(e)), 413
+    except LVGLError as e:
+        # 参数/格式错误 (如 v8 不支持的色彩格式、损坏的 .bin)，进程池原样回传异常类型
+        return jsonify(success=False, error=str(e)), 400
+    except JobTimeout as e:
+        return jsonify(success=False, error=str(e)), 504
+    except Exception as e:
+        return jsonify(success=False, error=str(e)), 500
+
+@lvgl_image_bp.route('/preview', methods=['POST'])
+def preview():
+    """
+    设备端效果预览：返回转换结果解码后的 PNG
+    - 上传 .bin：直接解码已转换的文件
+    - 上传图片：与 /convert 相同参数转换为 BIN 后解码，BIN 结果写入缓存
+    转换配额用完后不再预览；预览单独记录，每日上限为转换配额的 LVGL_PREVIEW_PER_CONVERT 倍
+    """
+    vid, logged, role = get_visitor_id()
+    config = get_tool_config()
+    limit = config.get('daily_limit_pro', 200) if role == 'pro' else (config.get('daily_limit_free', 20) if logged else config.get('daily_limit_free', 20) // 4)
+
+    try:
+        res = d1.execute("SELECT SUM(path = '/lvgl_image/convert') as converts, SUM(path = '/lvgl_image/preview') as previews FROM usage_logs WHERE user_id = ? AND path IN ('/lvgl_image/convert', '/lvgl_image/preview') AND request_date = DATE('now')", [vid])
+        row = res['results'][0] if res and res.get('results') else {}
+        if (row.get('converts') or 0) >= limit or (row.get('previews') or 0) >= limit * Config.LVGL_PREVIEW_PER_CONVERT:
+            return jsonify(success=False, error="Quota exceeded"), 403
+    except: pass
+
+    file = request.files.get('file')
+    if not file: return jsonify(success=False, error="No file"), 400
+
+    try:
+        upload = file.read()
+        if file.filename.lower().endswith('.bin'):
+            check_bin(upload)
+            png_data, info = conversion_pool.submit(preview_bin, upload).wait()
+        else:
+            opts = parse_convert_options(dict(request.form.to_dict(), ofmt='BIN'), file.filename)
+            if opts['cf'] in ('RAW', 'RAW_ALPHA'): return jsonify(success=False, error="RAW formats are decoded on device, no preview"), 400
+            key = conversion_cache.make_key(upload, opts)
+            hit = conversion_cache.get(key)
+            if hit:
+                png_data, info = conversion_pool.submit(preview_bin, hit[1]).wait()
             else:
-                opath += ".bin"
-                img.to_bin(opath, compress=CompressMethod[compress_str])
+                check_upload(upload, opts)
+                download_name, bin_data, png_data, info = conversion_pool.submit(preview_upload, upload, opts).wait()
+                conversion_cache.put(key, download_name, bin_data)
+        d1.execute("INSERT INTO usage_logs (user_id, path, status) VALUES (?, ?, ?)", [vid, '/lvgl_image/preview', 200])
+        resp = send_file(io.BytesIO(png_data), mimetype='image/png')
+        resp.headers['X-LVGL-Info'] = info
+        return resp
+    except PoolBusy as e:
+        return busy_response(e)
+    except ImageTooLarge as e:
+        return jsonify(success=False, error=str(e)), 413
+    except LVGLError as e:
+        return jsonify(success=False, error=str(e)), 400
+    except JobTimeout as e:
+        return jsonify(success=False, error=str(e)), 504
+    except Exception as e:
+        return jsonify(success=False, error=str(e)), 500
 
-        with open(opath, 'rb') as f: data = f.read()
-        shutil.rmtree(task_dir)
-        d1.execute("INSERT INTO usage_logs (user_id, path, status) VALUES (?, ?, ?)", [vid, '/lvgl_image/convert', 200])
-        return send_file(io.BytesIO(data), as_attachment=True, download_name=os.path.basename(opath))
+@lvgl_image_bp.route('/convert_batch', methods=['POST'])
+def convert_batch():
+    """
+    批量转换：多个 files 或一个 ZIP -> 单个 ZIP (每张图一个 .c/.bin + 聚合 .h)
+    配置与配额只查询一次，按成功数量一次性记账
+    """
+    vid, logged, role = get_visitor_id()
+    config = get_tool_config()
+    limit = config.get('daily_limit_pro', 200) if role == 'pro' else (config.get('daily_limit_free', 20) if logged else config.get('daily_limit_free', 20) // 4)
+
+    uploads = [(f.filename, f.read()) for f in request.files.getlist('files') if f and f.filename]
+    if not uploads: return jsonify(success=False, error="No file"), 400
+    try:
+        items = collect_batch_files(uploads)
+        opts_list = batch_options(request.form, items)
+    except (ValueError, zipfile.BadZipFile, LVGLError) as e:
+        return jsonify(success=False, error=str(e)), 400
+    if not items: return jsonify(success=False, error="No image in upload"), 400
+
+    try:
+        res = d1.execute("SELECT COUNT(*) as count FROM usage_logs WHERE user_id = ? AND path = '/lvgl_image/convert' AND request_date = DATE('now')", [vid])
+        used = res['results'][0]['count'] if res and res.get('results') else 0
+        if used + len(items) > limit: return jsonify(success=False, error="Quota exceeded", remaining=max(0, limit - used)), 403
+    except: pass
+
+    try:
+        # 先查缓存，未命中的文件并行提交到进程池
+        results, pending, cached, errors = [None] * len(items), {}, 0, []
+        for i, ((filename, data), opts) in enumerate(zip(items, opts_list)):
+            key = conversion_cache.make_key(data, opts)
+            hit = conversion_cache.get(key)
+            if hit:
+                results[i] = hit
+                cached += 1
+            else:
+                try: check_upload(data, opts)
+                except ImageTooLarge as e:
+                    errors.append(f"{filename}: {e}")
+                    continue
+                # 批量任务排队等待空位，超过单任务超时仍无空位则 429
+                pending[i] = (key, conversion_pool.submit(convert_upload, data, opts, block=True, timeout=Config.LVGL_JOB_TIMEOUT))
+
+        for i, (key, job) in pending.items():
+            try:
+                results[i] = job.wait()
+                conversion_cache.put(key, *results[i])
+            except Exception as e:
+                errors.append(f"{items[i][0]}: {e}")
+
+        ok = [(opts, r) for opts, r in zip(opts_list, results) if r]
+        if not ok: return jsonify(success=False, error="All conversions failed", details=errors), 500
+
+        lv_version = opts_list[0]['lv_version']
+        bundle = parse_convert_options(request.form, 'lvgl_assets')['output_name'] or 'lvgl_assets'
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for _, (name, data) in ok: zf.writestr(name, data)
+            c_names = [opts['output_name'] for opts, (name, _) in ok if name.endswith('.c')]
+            if c_names: zf.writestr(f"{bundle}.h", batch_header(bundle, c_names, lv_version))
+            if errors: zf.writestr("errors.txt", "\n".join(errors) + "\n")
+
+        # 成功的文件按张计入配额：多行 INSERT 按 D1 绑定参数上限分块，整体一次批量请求
+        stmts = []
+        for start in range(0, len(ok), USAGE_ROWS_PER_INSERT):
+            n = min(USAGE_ROWS_PER_INSERT, len(ok) - start)
+            stmts.append(("INSERT INTO usage_logs (user_id, path, status) VALUES " + ", ".join(["(?, ?, ?)"] * n), [vid, '/lvgl_image/convert', 200] * n))
+        charged = d1.execute_batch(stmts)
+        if not charged['success']: print(f"⚠️ [LVGL] Batch quota charge fail ({len(ok)} files): {charged.get('error')}")
+
+        buf.seek(0)
+        resp = send_file(buf, as_attachment=True, download_name=f"{bundle}.zip", mimetype='application/zip')
+        resp.headers['X-LVGL-Batch'] = f"converted={len(ok)}; failed={len(errors)}; cached={cached}"
+        return resp
+    except PoolBusy as e:
+        return busy_response(e)
     except Exception as e:
-        if os.path.exists(task_dir): shutil.rmtree(task_dir)
         return jsonify(success=False, error=str(e)), 500
+
+# --- 异步任务：大图 (如 4K + LZ4/RLE) 走 提交 -> 轮询 -> 下载，避免代理超时 ---
+@lvgl_image_bp.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    提交异步转换任务，返回 job_id 与轮询/下载地址
+    任务表与进程池都在当前进程内：多个 Web worker (如 gunicorn -w N) 时轮询会落到别的进程返回 404，
+    需单进程部署 (python app.py，或 gunicorn -w 1 --threads N)
+    """
+    vid, logged, role = get_visitor_id()
+    config = get_tool_config()
+    limit = config.get('daily_limit_pro', 200) if role == 'pro' else (config.get('daily_limit_free', 20) if logged else config.get('daily_limit_free', 20) // 4)
+
+    try:
+        res = d1.execute("SELECT COUNT(*) as count FROM usage_logs WHERE user_id = ? AND path = '/lvgl_image/convert' AND request_date = DATE('now')", [vid])
+        if res and res['results'][0]['count'] >= limit: return jsonify(success=False, error="Quota exceeded"), 403
+    except: pass
+
+    file = request.files.get('file')
+    if not file: return jsonify(success=False, error="No file"), 400
+
+    try:
+        opts = parse_convert_options(request.form, file.filename)
+        upload = file.read()
+        key = conversion_cache.make_key(upload, opts)
+        hit = conversion_cache.get(key)
+        if hit:
+            d1.execute("INSERT INTO usage_logs (user_id, path, status) VALUES (?, ?, ?)", [vid, '/lvgl_image/convert', 200])
+            job_id = job_store.add(vid, result=hit)
+        else:
+            def on_done(job):
+                # 调度线程中执行：成功才写缓存并计入配额
+                if job.error: return
+                conversion_cache.put(key, *job.result)
+                d1.execute("INSERT INTO usage_logs (user_id, path, status) VALUES (?, ?, ?)", [vid, '/lvgl_image/convert', 200])
+            check_upload(upload, opts)
+            job_id = job_store.add(vid, conversion_pool.submit(convert_upload, upload, opts, track=True, on_done=on_done))
+        return jsonify(success=True, job_id=job_id,
+                       status_url=url_for('lvgl_image.job_status', job_id=job_id),
+                       download_url=url_for('lvgl_image.job_download', job_id=job_id)), 202
+    except PoolBusy as e:
+        return busy_response(e)
+    except ImageTooLarge as e:
+        return jsonify(success=False, error=str(e)), 413
+    except LVGLError as e:
+        return jsonify(success=False, error=str(e)), 400
+    except Exception as e:
+        return jsonify(success=False, error=str(e)), 500
+
+@lvgl_image_bp.route('/jobs/<job_id>')
+def job_status(job_id):
+    vid, _, _ = get_visitor_id()
+    entry = job_store.get(job_id, vid)
+    if not entry: return jsonify(success=False, error="Job not found or expired"), 404
+    return jsonify(success=True, job_id=job_id, **job_store.status(entry))
+
+@lvgl_image_bp.route('/jobs/<job_id>/download')
+def job_download(job_id):
+    vid, _, _ = get_visitor_id()
+    entry = job_store.get(job_id, vid)
+    if not entry: return jsonify(success=False, error="Job not found or expired"), 404
+    result = job_store.result(entry)
+    if not result: return jsonify(success=False, **job_store.status(entry)), 409
+    download_name, data = result
+    return send_file(io.BytesIO(data), as_attachment=True, download_name=download_name)
@@ -0,0 +1,116 @@
+"""
+版本化数据库迁移：同一组有序迁移同时作用于本地 SQLite 与 Cloudflare D1
+已执行的版本记录在 schema_migrations 表，每个迁移连同版本记录在一个事务内执行
+
+本地环境在 Database 初始化时自动执行；D1 在部署前手动执行：
+    python -m tools.migrations            # 执行待执行的迁移 (按 ENV 选择数据库)
+    python -m tools.migrations --status   # 只查看状态
+"""
+import sys
+
+def add_column(table, column, decl):
+    """容错加列：列已存在时跳过 (取代原 fix_db_columns.py 的手工 ALTER)"""
+    def step(db):
+        res = db.execute(f"PRAGMA table_info({table})")
+        cols = {r['name'] for r in res.get('results', [])} if res else set()
+        return [] if column in cols else [f"ALTER TABLE {table} ADD COLUMN {column} {decl}"]
+    return step
+
+# (版本, 名称, 步骤)；步骤为 SQL 字符串，或接收 db 返回 SQL 列表的函数
+# 只允许追加新版本，已发布的迁移不要修改
+MIGRATIONS = [
+    (1, 'initial_schema', [
+        "CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE, password_hash TEXT, role TEXT DEFAULT 'free', avatar TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)",
+        """CREATE TABLE IF NOT EXISTS tool_configs (
+            path TEXT PRIMARY KEY,
+            is_public INTEGER DEFAULT 0,
+            required_role TEXT DEFAULT 'user',
+            limit_type TEXT DEFAULT 'request',
+            daily_limit_free INTEGER DEFAULT 10,
+            daily_limit_pro INTEGER DEFAULT 1000,
+            shadow TEXT,
+            label TEXT,
+            color TEXT
+        )""",
+        "CREATE TABLE IF NOT EXISTS usage_logs (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, path TEXT, status INTEGER DEFAULT 200, request_date DATE DEFAULT (DATE('now')), created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)",
+        "CREATE TABLE IF NOT EXISTS components (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, category TEXT, name TEXT, model TEXT, package TEXT, quantity INTEGER, unit TEXT, price REAL, supplier TEXT, channel TEXT, location TEXT, buy_time TEXT, remark TEXT, creator TEXT, img_path TEXT, doc_path TEXT, qrcode_path TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)",
+        # 元器件多文档支持
+        """CREATE TABLE IF NOT EXISTS component_docs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            component_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            file_name TEXT NOT NULL,
+            file_url TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""",
+        # Project Hub 项目表
+        """CREATE TABLE IF NOT EXISTS projects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            status TEXT DEFAULT '进行中',
+            description TEXT,
+            cover_img TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""",
+    ]),
+    # 早期建的 components 表缺少这两列
+    (2, 'components_doc_qrcode_columns', [
+        add_column('components', 'qrcode_path', 'TEXT'),
+        add_column('components', 'doc_path', 'TEXT'),
+    ]),
+    # 反馈中心 (support) 使用，user_id 为访客 ID
+    (3, 'bug_reports', [
+        """CREATE TABLE IF NOT EXISTS bug_reports (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT,
+            page_url TEXT,
+            content TEXT,
+            device_info TEXT,
+            img_path TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""",
+    ]),
+    # 配额检查 / 个人中心 / 元器件列表不再全表扫描
+    (4, 'query_indexes', [
+        "CREATE INDEX IF NOT EXISTS idx_usage_logs_user_path_date ON usage_logs (user_id, path, request_date)",
+        "CREATE INDEX IF NOT EXISTS idx_usage_logs_user_created ON usage_logs (user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_components_user_created ON components (user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_component_docs_component ON component_docs (component_id)",
+        "CREATE INDEX IF NOT EXISTS idx_projects_user_created ON projects (user_id, created_at)",
+    ]),
+]
+
+def applied_versions(db):
+    db.execute("CREATE TABLE IF NOT EXISTS schema_migrations (version INTEGER PRIMARY KEY, name TEXT, applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+    res = db.execute("SELECT version FROM schema_migrations")
+    if res is None: raise RuntimeError("无法读取 schema_migrations")
+    return {r['version'] for r in res.get('results', [])}
+
+def migrate(db, verbose=False):
+    """按版本顺序执行待执行的迁移，返回本次执行的版本列表；失败时抛出 RuntimeError"""
+    done = applied_versions(db)
+    applied = []
+    for version, name, steps in MIGRATIONS:
+        if version in done: continue
+        batch = []
+        for step in steps:
+            for sql in ([step] if isinstance(step, str) else step(db)): batch.append((sql, []))
+        batch.append(("INSERT INTO schema_migrations (version, name) VALUES (?, ?)", [version, name]))
+        res = db.execute_batch(batch, transactional=True)
+        if not res['success']:
+            # 多进程同时启动时可能已被其它进程执行
+            if version in applied_versions(db): continue
+            raise RuntimeError(f"迁移 {version}_{name} 失败: {res.get('error')}")
+        applied.append(version)
+        if verbose: print(f"✅ [DB] 迁移 {version}_{name}")
+    return applied
+
+if __name__ == '__main__':
+    from tools.database import d1
+    if '--status' in sys.argv:
+        done = applied_versions(d1)
+        for version, name, _ in MIGRATIONS: print(f"{'✅' if version in done else '⏳'} {version}_{name}")
+    else:
+        applied = migrate(d1, verbose=True)
+        print(f"完成，本次执行 {len(applied)} 个迁移" if applied else "已是最新版本")
@@ -160,20 +160,30 @@ def profile_api():
     elif 'projects' in source: from_path = '/projects'
     
     try:
-        user_res = d1.execute("SELECT username, role, avatar, created_at FROM users WHERE id = ?", [uid])
+        # 0. 先登记全部查询，首次取结果时合并为一次 D1 请求
+        q = d1.deferred()
+        user_q = q.execute("SELECT username, role, avatar, created_at FROM users WHERE id = ?", [uid])
+        if from_path:
+            config_q = q.execute("SELECT * FROM tool_configs WHERE path = ?", [from_path])
+        else:
+            config_q = q.execute("SELECT * FROM tool_configs WHERE is_public = 1")
+        usage_q = q.execute("SELECT path, COUNT(*) as cnt FROM usage_logs WHERE user_id = ? AND request_date = DATE('now') GROUP BY path", [uid])
+        component_q = q.execute("SELECT COUNT(*) as count FROM components WHERE user_id = ?", [uid]) if from_path in ('', '/inventory') else None
+        total_api_q = q.execute("SELECT COUNT(*) as count FROM usage_logs WHERE user_id = ?", [uid])
+        tools_cfg_q = q.execute("SELECT path, label FROM tool_configs")
+        logs_q = q.execute("SELECT path, created_at, status FROM usage_logs WHERE user_id = ? ORDER BY created_at DESC LIMIT 50", [uid])
+
+        user_res = user_q.result()
         u = user_res['results'][0] if user_res and user_res.get('results') else {}
         if not u: return jsonify(success=False, error="User not found"), 404
         
         role = u.get('role', 'free')
         
         # 1. 获取工具配置与配额统计 (GROUP BY 优化)
-        if from_path:
-            config_res = d1.execute("SELECT * FROM tool_configs WHERE path = ?", [from_path])
-        else:
-            config_res = d1.execute("SELECT * FROM tool_configs WHERE is_public = 1")
+        config_res = config_q.result()
         configs = config_res.get('results', []) if config_res else []
 
-        usage_res = d1.execute("SELECT path, COUNT(*) as cnt FROM usage_logs WHERE user_id = ? AND request_date = DATE('now') GROUP BY path", [uid])
+        usage_res = usage_q.result()
         usage_map = {item['path']: item['cnt'] for item in usage_res.get('results', [])} if usage_res else {}
 
         quotas = []
@@ -182,7 +192,7 @@ def profile_api():
             limit = cfg['daily_limit_pro'] if role == 'pro' else cfg['daily_limit_free']
             used = 0
             if path == '/inventory':
-                c_res = d1.execute("SELECT COUNT(*) as count FROM components WHERE user_id = ?", [uid])
+                c_res = (component_q or q.execute("SELECT COUNT(*) as count FROM components WHERE user_id = ?", [uid])).result()
                 used = c_res['results'][0]['count'] if c_res and c_res.get('results') else 0
                 unit = "个"
             else:
@@ -201,16 +211,16 @@ def profile_api():
             try: delta = datetime.utcnow() - datetime.strptime(u['created_at'][:10], '%Y-%m-%d'); days = max(1, delta.days)
             except: pass
             
-        total_api_res = d1.execute("SELECT COUNT(*) as count FROM usage_logs WHERE user_id = ?", [uid])
+        total_api_res = total_api_q.result()
         total_calls = total_api_res['results'][0]['count'] if total_api_res else 0
 
         # 3. 动态记录：5 分钟去重逻辑
-        tools_cfg_res = d1.execute("SELECT path, label FROM tool_configs")
+        tools_cfg_res = tools_cfg_q.result()
         path_map = {cfg['path']: cfg['label'] for cfg in tools_cfg_res.get('results', [])} if tools_cfg_res else {}
 
-        logs_res = d1.execute("SELECT path, created_at, status FROM usage_logs WHERE user_id = ? ORDER BY created_at DESC LIMIT 50", [uid])
+        logs_res = logs_q.result()
         activities = []
-        raw_logs = logs_res.get('results', [])
+        raw_logs = logs_res.get('results', []) if logs_res else []
         last_log = None
         from datetime import timedelta
 